@@ -4,7 +4,9 @@ Creates and configures the Flask app and SocketIO instance.
 """
 
 import os
+import sys
 import logging
+import orjson
 from flask import Flask
 from flask_socketio import SocketIO
 
@@ -12,6 +14,48 @@ from flask_socketio import SocketIO
 socketio = SocketIO()
 logger = logging.getLogger("interview-server")
 
+def _raise_file_limit():
+    """
+    Raise the open file descriptor soft limit to the hard limit.
+    
+    Every connected VR client holds a socket, so the common default of 1024
+    descriptors caps the server at roughly a thousand concurrent sessions.
+    For persistent limits configure LimitNOFILE (systemd) or
+    /etc/security/limits.conf as well.
+    """
+    if sys.platform == 'win32':
+        return
+    
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft == hard:
+            return
+        
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        logger.info(f"Raised open file limit from {soft} to {hard}")
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Could not raise open file limit: {e}")
+
+_raise_file_limit()
+
+class OrjsonPacketCodec:
+    """
+    JSON module for Socket.IO packets backed by orjson.
+    
+    Every emitted event is JSON encoded by python-socketio, so state updates
+    and audio acknowledgements all go through this codec.
+    """
+    
+    @staticmethod
+    def dumps(obj, **kwargs):
+        # orjson output is always compact, so separators are ignored
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    
+    @staticmethod
+    def loads(data, **kwargs):
+        return orjson.loads(data)
+
 def create_app(config=None):
     """
     Create and configure the Flask application.
@@ -33,7 +77,9 @@ def create_app(config=None):
         RESPONSE_FOLDER="data/audio/responses",
         CONVERSATION_FOLDER="data/conversations",
         MAX_CONTENT_LENGTH=16 * 1024 * 1024,  # 16 MB max upload size
-        SESSION_TIMEOUT=1800  # 30 minutes
+        SESSION_TIMEOUT=1800,  # 30 minutes
+        SESSION_ARCHIVE_AFTER=300,  # Move idle sessions to disk after 5 minutes
+        X_ACCEL_REDIRECT_PREFIX=None  # nginx internal location for response audio
     )
     
     # Update with provided configuration
@@ -41,6 +87,15 @@ def create_app(config=None):
         # Update session timeout
         if 'interview' in config and 'session_timeout' in config['interview']:
             app.config['SESSION_TIMEOUT'] = config['interview']['session_timeout']
+        if 'interview' in config and 'session_archive_after' in config['interview']:
+            app.config['SESSION_ARCHIVE_AFTER'] = config['interview']['session_archive_after']
+        
+        # Offload response audio transfers to the front-end web server
+        if 'server' in config:
+            if 'x_accel_redirect_prefix' in config['server']:
+                app.config['X_ACCEL_REDIRECT_PREFIX'] = config['server']['x_accel_redirect_prefix']
+            if 'use_x_sendfile' in config['server']:
+                app.config['USE_X_SENDFILE'] = config['server']['use_x_sendfile']
         
         # Update path configurations
         if 'paths' in config:
@@ -59,39 +114,61 @@ def create_app(config=None):
     os.makedirs(app.config['RESPONSE_FOLDER'], exist_ok=True)
     os.makedirs(app.config['CONVERSATION_FOLDER'], exist_ok=True)
     
+    # Socket.IO transport settings. Only eventlet is supported: server.py
+    # monkey-patches for it, the state manager runs eventlet greenthreads
+    # and blocking file and queue work goes through eventlet.tpool.
+    server_config = config.get('server', {}) if config else {}
+    async_mode = server_config.get('async_mode', 'eventlet')
+    if async_mode != 'eventlet':
+        raise ValueError(f"Unsupported server.async_mode '{async_mode}': only 'eventlet' is supported")
+    ping_timeout = server_config.get('ping_timeout', 60)
+    ping_interval = server_config.get('ping_interval', 25)
+    
     # Initialize SocketIO with the app - handle compatibility with different versions
     try:
         # Full configuration with all optimizations
         socketio_kwargs = {
             'cors_allowed_origins': '*',  # Allow connections from any origin
-            'async_mode': 'eventlet',
-            'ping_timeout': 60,  # Increase ping timeout for longer operations
-            'ping_interval': 25,  # More frequent pings to detect disconnects
+            'async_mode': async_mode,
+            'ping_timeout': ping_timeout,  # Increase ping timeout for longer operations
+            'ping_interval': ping_interval,  # More frequent pings to detect disconnects
             'max_http_buffer_size': 50 * 1024 * 1024,  # 50MB buffer for larger payloads
-            'engineio_logger': True  # Enable detailed Socket.IO logging
+            'json': OrjsonPacketCodec,  # Faster packet encoding
+            # Per-packet transport logging is off unless asked for in config
+            'engineio_logger': bool(server_config.get('engineio_logger', False)),
+            'logger': bool(server_config.get('socketio_logger', False))
         }
         
         # Test if socketio accepts these parameters
-        test_socket = SocketIO(async_mode='eventlet', ping_timeout=60)
+        test_socket = SocketIO(async_mode=async_mode, ping_timeout=ping_timeout)
         del test_socket
     except TypeError as e:
         # Fallback to basic configuration
         logger.warning(f"Using basic SocketIO configuration due to: {e}")
         socketio_kwargs = {
             'cors_allowed_origins': '*',  # Allow connections from any origin
-            'async_mode': 'eventlet'
+            'async_mode': async_mode
         }
     
     # Update SocketIO config if provided
-    if config and 'server' in config and 'cors_allowed_origins' in config['server']:
-        socketio_kwargs['cors_allowed_origins'] = config['server']['cors_allowed_origins']
+    if 'cors_allowed_origins' in server_config:
+        socketio_kwargs['cors_allowed_origins'] = server_config['cors_allowed_origins']
     
     socketio.init_app(app, **socketio_kwargs)
     
     # Import and register WebSocket event handlers
+    from app.state_manager import state_manager
+    state_manager.init_config(app)
+    
     from app.websocket import register_events
     register_events(socketio)
     
+    # Archive idle sessions next to saved conversations
+    state_manager.configure_archive(
+        os.path.join(app.config['CONVERSATION_FOLDER'], 'archive'),
+        app.config['SESSION_ARCHIVE_AFTER']
+    )
+    
     # Import and register HTTP routes
     from app.routes import register_routes
     register_routes(app)
@@ -5,23 +5,117 @@ Stores session state, conversation history, and audio handling.
 
 import os
 import time
-import json
-import wave
 import array
 import struct
+import binascii
 import logging
+import itertools
+from collections import deque
+from types import MappingProxyType
 from datetime import datetime
+import orjson
+from eventlet.semaphore import Semaphore
 
 logger = logging.getLogger("interview-server")
 
+# Base64 decoder for audio from clients that send text rather than binary
+# frames. pybase64 uses SIMD kernels where the CPU has them; binascii is
+# the fallback.
+try:
+    from pybase64 import b64decode as _b64decode
+except ImportError:
+    _b64decode = binascii.a2b_base64
+
+# Characters of base64 audio text gathered before it is decoded in one call
+AUDIO_B64_BATCH_CHARS = 256 * 1024
+
+# Size of the per-session scratch buffer incoming audio chunks are gathered
+# in before being written out; a few seconds of 44.1 kHz 16-bit mono, so a
+# typical utterance reaches the file in a handful of write() calls.
+AUDIO_SCRATCH_SIZE = 256 * 1024  # 256 KiB
+
+# Default number of audio chunks acknowledged by each audio_received event;
+# 0 disables the acks
+AUDIO_ACK_INTERVAL = 16
+
+# Conversation compaction: once the history holds more than twice
+# HISTORY_KEEP_TAIL messages, everything but the most recent HISTORY_KEEP_TAIL
+# is folded into a single summary entry at the head of the history.
+HISTORY_KEEP_TAIL = 20
+SUMMARY_SNIPPET_LENGTH = 80  # Characters kept from each compacted message
+SUMMARY_MAX_LENGTH = 2000  # Characters kept in the rolling summary
+
+# Size of the canonical 44-byte PCM WAV header, and the offsets of the two
+# size fields that are only known once a recording is finished
+WAV_HEADER_SIZE = 44
+WAV_RIFF_SIZE_OFFSET = 4
+WAV_DATA_SIZE_OFFSET = 40
+
+# Precompiled layouts of the WAV header and of its 32-bit size fields
+_WAV_HEADER_STRUCT = struct.Struct('<4sI4s4sIHHIIHH4sI')
+_WAV_SIZE_STRUCT = struct.Struct('<I')
+
+# Pre-formatted lines kept for get_formatted_history; compaction means the
+# history never holds more verbatim messages than this
+FORMATTED_HISTORY_LINES = 2 * HISTORY_KEEP_TAIL
+
+# Directories already created by _ensure_parent_dir
+_ensured_dirs = set()
+
+def _ensure_parent_dir(filepath):
+    """
+    Create the parent directory of a file if it has not been ensured yet.
+    
+    Args:
+        filepath (str): Path of the file about to be written
+    """
+    directory = os.path.dirname(filepath)
+    if directory and directory not in _ensured_dirs:
+        os.makedirs(directory, exist_ok=True)
+        _ensured_dirs.add(directory)
+
+def _format_message(speaker, text):
+    """
+    Format a message as a line of prompt history.
+    
+    Args:
+        speaker (str): Either "user" or "interviewer"
+        text (str): The message text
+        
+    Returns:
+        str: The formatted line, including the trailing newline
+    """
+    speaker_label = "Candidate" if speaker == "user" else "Interviewer"
+    return f"{speaker_label}: {text}\n"
+
 class InterviewSession:
     """
     Represents an interview session with a candidate.
     
     Stores the state, conversation history, and handles audio data
-    for a specific interview session.
+    for a specific interview session. The conversation history is bounded:
+    it never holds more than 2 * HISTORY_KEEP_TAIL verbatim messages plus
+    one rolling summary entry.
     """
     
+    # Fixed attribute layout; every instance attribute must be declared here
+    __slots__ = (
+        'session_id', 'client_id', 'position', 'difficulty', 'interviewer_type',
+        'personality_prompt', 'state', 'process_lock', 'task_id', 'active', 'created_at', 'last_activity', 'state_timestamp',
+        'turn_index', 'conversation_history', 'summary_head', 'compacted_count',
+        '_formatted_tail', '_msg_fingerprints', 'message_counts', 'message_chars',
+        'audio_ack_interval', '_chunk_count',
+        '_upload_prefix', '_pending_b64', '_pending_b64_len', '_wav_file', '_wav_path', '_total_len', '_pcm_buf', '_pcm_len',
+        '_dict_cache'
+    )
+    
+    # Format of incoming audio, shared by all sessions
+    AUDIO_FORMAT = MappingProxyType({
+        'channels': 1,
+        'sample_width': 2,  # 16-bit audio
+        'sample_rate': 44100
+    })
+    
     def __init__(self, session_id, client_id=None, position="Software Engineer", 
                  difficulty=0.5, interviewer_type="professional"):
         """
@@ -34,30 +128,58 @@ class InterviewSession:
             difficulty (float, optional): Interview difficulty (0.0-1.0). Defaults to 0.5.
             interviewer_type (str, optional): Type of interviewer. Defaults to "professional".
         """
+        self._dict_cache = None  # Cached to_dict() snapshot
         self.session_id = session_id
         self.client_id = client_id
         self.position = position
         self.difficulty = difficulty
         self.interviewer_type = interviewer_type
+        self.personality_prompt = None  # Resolved prompt for interviewer_type, set by the handlers
         
         # State information
         self.state = "idle"  # Initial state
         self.active = True
         self.created_at = time.time()
         self.last_activity = time.time()
-        self.state_timestamp = time.time()  # Add timestamp for state changes
+        self.state_timestamp = time.monotonic()  # Monotonic time of the last state change
         self.turn_index = 0
+        # Held while an utterance is in the processing pipeline, so a
+        # duplicate stop_speaking cannot start a second run
+        self.process_lock = Semaphore(1)
+        # Worker task whose results are still wanted; results of any other
+        # task are stale and dropped
+        self.task_id = None
         
         # Conversation history
         self.conversation_history = []
+        self.summary_head = None  # Summary of compacted older messages
+        self.compacted_count = 0  # Number of messages folded into the summary
+        self._formatted_tail = deque(maxlen=FORMATTED_HISTORY_LINES)  # Formatted recent messages
+        # Occurrences of each (speaker, text) among the verbatim messages,
+        # so has_message is a hash probe rather than a history scan
+        self._msg_fingerprints = {}
         
-        # Audio buffer for handling streaming audio
-        self.audio_buffer = bytearray()
-        self.audio_format = {
-            'channels': 1,
-            'sample_width': 2,  # 16-bit audio
-            'sample_rate': 44100
-        }
+        # Running per-speaker totals, which survive compaction
+        self.message_counts = {}  # Number of messages by speaker
+        self.message_chars = {}  # Total message length by speaker
+        
+        # Recording state for streaming audio. Incoming chunks are written
+        # straight to the WAV file of the current utterance, so memory use
+        # does not grow with the length of the answer.
+        self._upload_prefix = None  # Recording path up to the turn index
+        self._wav_file = None
+        self._wav_path = None
+        self._total_len = 0
+        self._chunk_count = 0  # Chunks received for the current recording
+        self._pending_b64 = []  # Base64 chunks not yet decoded
+        self._pending_b64_len = 0  # Total length of _pending_b64
+        self.audio_ack_interval = AUDIO_ACK_INTERVAL  # Chunks per audio_received ack
+        
+        # Scratch buffer for pending chunks, allocated on the first
+        # recording and reused for every later one while the session is
+        # active
+        self._pcm_buf = None
+        self._pcm_len = 0  # Bytes of _pcm_buf not yet written to the file
         
         logger.info(f"Created new interview session: {session_id}")
     
@@ -75,6 +197,116 @@ class InterviewSession:
             "timestamp": time.time()
         })
         self.last_activity = time.time()
+        self._dict_cache = None
+        
+        self._count_message(speaker, text)
+        self._formatted_tail.append(_format_message(speaker, text))
+        self._add_fingerprint(speaker, text)
+        
+        if len(self.conversation_history) > 2 * HISTORY_KEEP_TAIL:
+            self.compact()
+    
+    def _count_message(self, speaker, text):
+        """
+        Add a message to the running per-speaker totals.
+        
+        Args:
+            speaker (str): Either "user" or "interviewer"
+            text (str): The message text
+        """
+        self.message_counts[speaker] = self.message_counts.get(speaker, 0) + 1
+        self.message_chars[speaker] = self.message_chars.get(speaker, 0) + len(text)
+    
+    def _add_fingerprint(self, speaker, text):
+        """
+        Record a verbatim message for has_message.
+        
+        Args:
+            speaker (str): Either "user" or "interviewer"
+            text (str): The message text
+        """
+        key = (speaker, text)
+        self._msg_fingerprints[key] = self._msg_fingerprints.get(key, 0) + 1
+    
+    def has_message(self, speaker, text):
+        """
+        Check whether a message is among the verbatim conversation history.
+        
+        Messages folded into the summary by compaction no longer count.
+        
+        Args:
+            speaker (str): Either "user" or "interviewer"
+            text (str): The message text
+            
+        Returns:
+            bool: True if the history holds this message
+        """
+        return (speaker, text) in self._msg_fingerprints
+    
+    def compact(self, keep_tail=HISTORY_KEEP_TAIL):
+        """
+        Fold older messages into a rolling summary entry.
+        
+        The history becomes a single {"speaker": "system"} summary entry
+        followed by the most recent keep_tail messages.
+        
+        Args:
+            keep_tail (int, optional): Number of recent messages to keep verbatim.
+                Defaults to HISTORY_KEEP_TAIL.
+        """
+        history = self.conversation_history
+        if len(history) <= 2 * keep_tail:
+            return
+        
+        # An existing summary entry is always the first one
+        has_summary = history[0]["speaker"] == "system"
+        old_entries = history[1 if has_summary else 0:-keep_tail]
+        
+        snippets = [self.summary_head] if self.summary_head else []
+        for entry in old_entries:
+            text = entry["text"]
+            if len(text) > SUMMARY_SNIPPET_LENGTH:
+                text = text[:SUMMARY_SNIPPET_LENGTH] + "..."
+            speaker_label = "Candidate" if entry["speaker"] == "user" else "Interviewer"
+            snippets.append(f"{speaker_label}: {text}")
+            
+            key = (entry["speaker"], entry["text"])
+            remaining = self._msg_fingerprints.get(key, 0) - 1
+            if remaining > 0:
+                self._msg_fingerprints[key] = remaining
+            else:
+                self._msg_fingerprints.pop(key, None)
+        
+        # Keep the most recent part of the summary if it grows too long,
+        # starting at a word boundary
+        summary = " ".join(snippets)
+        if len(summary) > SUMMARY_MAX_LENGTH:
+            summary = summary[-SUMMARY_MAX_LENGTH:]
+            summary = summary[summary.find(" ") + 1:]
+        
+        self.compacted_count += len(old_entries)
+        self.summary_head = summary
+        
+        summary_entry = {
+            "speaker": "system",
+            "text": summary,
+            "turns": [0, self.compacted_count],
+            "timestamp": history[0]["timestamp"]
+        }
+        history[:] = [summary_entry] + history[-keep_tail:]
+        self._dict_cache = None
+    
+    def clear_history(self):
+        """Clear the conversation history, including any summary."""
+        # Cleared in place to reuse the existing list and dicts
+        self.conversation_history.clear()
+        self._dict_cache = None
+        self.summary_head = None
+        self.compacted_count = 0
+        self._formatted_tail.clear()
+        self._msg_fingerprints.clear()
+        self.message_counts.clear()
+        self.message_chars.clear()
     
     def get_formatted_history(self, max_turns=10):
         """
@@ -86,57 +318,296 @@ class InterviewSession:
         Returns:
             str: Formatted conversation history
         """
-        # Take the most recent turns (up to max_turns)
-        recent_history = self.conversation_history[-max_turns*2:] if self.conversation_history else []
+        # Take the most recent turns (up to max_turns) from the lines
+        # formatted as messages were added
+        recent_lines = self._formatted_tail
+        skip = len(recent_lines) - max_turns * 2
+        if skip > 0:
+            recent_lines = itertools.islice(recent_lines, skip, None)
         
         formatted = ""
-        for entry in recent_history:
-            speaker_label = "Candidate" if entry["speaker"] == "user" else "Interviewer"
-            formatted += f"{speaker_label}: {entry['text']}\n"
+        if self.summary_head:
+            formatted += f"Summary of earlier conversation: {self.summary_head}\n"
         
-        return formatted
+        return formatted + "".join(recent_lines)
     
-    def add_audio_chunk(self, audio_bytes):
+    def _wav_header(self, data_size):
         """
-        Add an audio chunk to the buffer.
+        Build a PCM WAV header for this session's audio format.
         
         Args:
-            audio_bytes (bytes): Audio data to add
+            data_size (int): Number of audio bytes that follow the header
+            
+        Returns:
+            bytes: The 44-byte header
         """
-        self.audio_buffer.extend(audio_bytes)
+        channels = self.AUDIO_FORMAT['channels']
+        sample_width = self.AUDIO_FORMAT['sample_width']
+        sample_rate = self.AUDIO_FORMAT['sample_rate']
+        block_align = channels * sample_width
+        return _WAV_HEADER_STRUCT.pack(
+            b'RIFF', WAV_HEADER_SIZE - 8 + data_size, b'WAVE',
+            b'fmt ', 16, 1, channels, sample_rate, sample_rate * block_align,
+            block_align, sample_width * 8,
+            b'data', data_size
+        )
     
-    def clear_audio_buffer(self):
-        """Clear the audio buffer."""
-        self.audio_buffer = bytearray()
+    def upload_path(self, upload_folder):
+        """
+        Get the path the current turn's recording is written to.
+        
+        The folder and session ID never change, so they are joined once
+        into a prefix and only the turn index is appended per turn.
+        
+        Args:
+            upload_folder (str): Directory for uploaded audio
+            
+        Returns:
+            str: Path of the WAV file for the current turn
+        """
+        if self._upload_prefix is None:
+            self._upload_prefix = os.path.join(upload_folder, self.session_id) + "_"
+        return f"{self._upload_prefix}{self.turn_index}.wav"
     
-    def save_audio_buffer(self, filepath):
+    def start_recording(self, filepath):
         """
-        Save the audio buffer to a WAV file.
+        Open a WAV file to stream the next utterance into.
+        
+        Any recording still in progress is discarded first. The header is
+        written with zero sizes, which stop_recording patches.
         
         Args:
-            filepath (str): Path where the WAV file should be saved
+            filepath (str): Path where the WAV file should be written
             
         Returns:
             bool: True if successful, False otherwise
         """
+        self.discard_recording()
+        
         try:
             # Ensure directory exists
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            _ensure_parent_dir(filepath)
             
-            # Create WAV file
-            with wave.open(filepath, 'wb') as wav_file:
-                wav_file.setnchannels(self.audio_format['channels'])
-                wav_file.setsampwidth(self.audio_format['sample_width'])
-                wav_file.setframerate(self.audio_format['sample_rate'])
-                wav_file.writeframes(self.audio_buffer)
+            # Create WAV file unbuffered; chunks are gathered in the
+            # session's scratch buffer instead
+            wav_file = open(filepath, 'wb', buffering=0)
+            try:
+                wav_file.write(self._wav_header(0))
+            except Exception:
+                wav_file.close()
+                raise
             
-            logger.info(f"Saved audio to {filepath}")
+            self._wav_file = wav_file
+            self._wav_path = filepath
+            self._total_len = 0
+            self._chunk_count = 0
+            self._pending_b64.clear()
+            self._pending_b64_len = 0
+            self._pcm_len = 0
+            if self._pcm_buf is None:
+                self._pcm_buf = bytearray(AUDIO_SCRATCH_SIZE)
             return True
             
         except Exception as e:
-            logger.error(f"Error saving audio buffer: {e}")
+            logger.error(f"Error starting audio recording: {e}")
             return False
     
+    def add_audio_chunk(self, audio_bytes):
+        """
+        Append an audio chunk to the current recording.
+        
+        Args:
+            audio_bytes (bytes-like): Audio data to add
+        """
+        if self._wav_file is None:
+            return
+        
+        self._chunk_count += 1
+        # Keep the recording in order behind any base64 still pending
+        if self._pending_b64:
+            self._flush_b64()
+        # A memoryview over e.g. an array of samples counts items, not
+        # bytes; view it as bytes so sizes are in bytes
+        if isinstance(audio_bytes, memoryview) and audio_bytes.itemsize != 1:
+            audio_bytes = audio_bytes.cast('B')
+        self._append_pcm(audio_bytes)
+    
+    def add_audio_text(self, b64_chunk):
+        """
+        Append a base64 encoded audio chunk to the current recording.
+        
+        Chunks are gathered and decoded together, so one large decode
+        replaces many small ones. A chunk is only held back while it can
+        be concatenated with the next one, that is while it has no padding
+        and a length that is a multiple of 4.
+        
+        Args:
+            b64_chunk (str): Base64 encoded audio data to add
+        """
+        if self._wav_file is None:
+            return
+        
+        self._chunk_count += 1
+        self._pending_b64.append(b64_chunk)
+        self._pending_b64_len += len(b64_chunk)
+        
+        if (len(b64_chunk) & 3 or b64_chunk.endswith('=')
+                or self._pending_b64_len >= AUDIO_B64_BATCH_CHARS):
+            self._flush_b64()
+    
+    def _flush_b64(self):
+        """Decode the pending base64 chunks into the recording."""
+        pending = self._pending_b64
+        text = pending[0] if len(pending) == 1 else ''.join(pending)
+        self._pending_b64_len = 0
+        
+        try:
+            audio_bytes = _b64decode(text)
+        except (binascii.Error, ValueError) as e:
+            if len(pending) == 1:
+                logger.error(f"Dropping undecodable audio data: {e}")
+            else:
+                # Decode chunk by chunk, so only the malformed ones are lost
+                for chunk in pending:
+                    try:
+                        self._append_pcm(_b64decode(chunk))
+                    except (binascii.Error, ValueError) as e:
+                        logger.error(f"Dropping undecodable audio chunk: {e}")
+            return
+        finally:
+            pending.clear()
+        self._append_pcm(audio_bytes)
+    
+    def _append_pcm(self, audio_bytes):
+        """
+        Copy decoded PCM into the scratch buffer, writing it out when full.
+        
+        Args:
+            audio_bytes (bytes): Audio data to add
+        """
+        # Raw PCM is copied into the scratch buffer, which is written out
+        # only when full; the header sizes are patched once when the
+        # recording is stopped
+        size = len(audio_bytes)
+        end = self._pcm_len + size
+        if end > AUDIO_SCRATCH_SIZE:
+            self._flush_pcm()
+            if size > AUDIO_SCRATCH_SIZE:
+                # Too big to buffer, write it through
+                self._write_all(audio_bytes)
+                self._total_len += size
+                return
+            end = size
+        
+        self._pcm_buf[self._pcm_len:end] = audio_bytes
+        self._pcm_len = end
+        self._total_len += size
+    
+    def _write_all(self, data):
+        """
+        Write data to the unbuffered recording file, retrying short writes.
+        
+        Args:
+            data (bytes-like): Data to write
+        """
+        view = memoryview(data)
+        while view:
+            written = self._wav_file.write(view)
+            view = view[written:]
+    
+    def _flush_pcm(self):
+        """Write the pending contents of the scratch buffer to the recording."""
+        if self._pcm_len:
+            self._write_all(memoryview(self._pcm_buf)[:self._pcm_len])
+            self._pcm_len = 0
+    
+    @property
+    def total_bytes(self):
+        """int: Number of audio bytes in the current recording."""
+        return self._total_len
+    
+    @property
+    def chunk_count(self):
+        """int: Number of audio chunks in the current recording."""
+        return self._chunk_count
+    
+    @property
+    def is_recording(self):
+        """bool: Whether a recording is in progress."""
+        return self._wav_file is not None
+    
+    def stop_recording(self):
+        """
+        Finish the current recording and close its WAV file.
+        
+        Returns:
+            str or None: Path of the finished WAV file, or None if failed
+        """
+        wav_file = self._wav_file
+        if wav_file is None:
+            return None
+        
+        filepath = self._wav_path
+        try:
+            if self._pending_b64:
+                self._flush_b64()
+            data_size = self._total_len
+            self._flush_pcm()
+            
+            # RIFF chunks are padded to an even length
+            if data_size & 1:
+                wav_file.write(b'\x00')
+            
+            wav_file.seek(WAV_RIFF_SIZE_OFFSET)
+            wav_file.write(_WAV_SIZE_STRUCT.pack(WAV_HEADER_SIZE - 8 + data_size))
+            wav_file.seek(WAV_DATA_SIZE_OFFSET)
+            wav_file.write(_WAV_SIZE_STRUCT.pack(data_size))
+            wav_file.close()
+            logger.info(f"Saved audio to {filepath}")
+            return filepath
+            
+        except Exception as e:
+            logger.error(f"Error finishing audio recording: {e}")
+            return None
+        finally:
+            if not wav_file.closed:
+                try:
+                    wav_file.close()
+                except OSError:
+                    pass
+            self._wav_file = None
+            self._wav_path = None
+            self._pending_b64.clear()
+            self._pending_b64_len = 0
+            self._pcm_len = 0
+    
+    def discard_recording(self):
+        """Close and delete the current recording, if any."""
+        if self._wav_file is None:
+            return
+        
+        filepath = self._wav_path
+        # Drop pending chunks rather than writing them out
+        self._pending_b64.clear()
+        self._pending_b64_len = 0
+        self._pcm_len = 0
+        self.stop_recording()
+        try:
+            os.remove(filepath)
+        except OSError as e:
+            logger.warning(f"Could not remove discarded recording {filepath}: {e}")
+    
+    def release_audio_buffer(self):
+        """
+        Discard any recording and free the scratch buffer.
+        
+        Used when a session goes inactive, so idle sessions kept in memory
+        do not each hold AUDIO_SCRATCH_SIZE bytes; the buffer is allocated
+        again by the next start_recording.
+        """
+        self.discard_recording()
+        self._pcm_buf = None
+    
     def save_conversation(self, filepath):
         """
         Save the conversation history to a JSON file.
@@ -149,7 +620,7 @@ class InterviewSession:
         """
         try:
             # Ensure directory exists
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            _ensure_parent_dir(filepath)
             
             # Create conversation data
             conversation_data = {
@@ -160,12 +631,17 @@ class InterviewSession:
                 "created_at": self.created_at,
                 "last_activity": self.last_activity,
                 "turn_count": self.turn_index,
+                "message_counts": self.message_counts,
+                "message_chars": self.message_chars,
                 "history": self.conversation_history
             }
             
-            # Write to file
-            with open(filepath, 'w') as f:
-                json.dump(conversation_data, f, indent=2)
+            # Write to a temporary file and rename it into place so a crash
+            # mid-write never leaves a truncated conversation file behind
+            tmp_filepath = filepath + '.tmp'
+            with open(tmp_filepath, 'wb') as f:
+                f.write(orjson.dumps(conversation_data))
+            os.replace(tmp_filepath, filepath)
             
             logger.info(f"Saved conversation to {filepath}")
             return True
@@ -174,13 +650,88 @@ class InterviewSession:
             logger.error(f"Error saving conversation: {e}")
             return False
     
+    @classmethod
+    def load_conversation(cls, filepath):
+        """
+        Recreate a session from a file written by save_conversation.
+        
+        The restored session is inactive and idle; audio state and the
+        client binding are not persisted.
+        
+        Args:
+            filepath (str): Path to the saved JSON file
+            
+        Returns:
+            InterviewSession or None: The restored session, or None if failed
+        """
+        try:
+            with open(filepath, 'rb') as f:
+                data = orjson.loads(f.read())
+            
+            session = cls(
+                session_id=data["session_id"],
+                position=data["position"],
+                difficulty=data["difficulty"],
+                interviewer_type=data["interviewer_type"]
+            )
+            session.active = False
+            session.created_at = data["created_at"]
+            session.last_activity = data["last_activity"]
+            session.turn_index = data["turn_count"]
+            session.conversation_history = data["history"]
+            
+            # Restore the rolling summary if the history was compacted
+            history = session.conversation_history
+            if history and history[0]["speaker"] == "system":
+                session.summary_head = history[0]["text"]
+                session.compacted_count = history[0]["turns"][1]
+            
+            if "message_counts" in data:
+                session.message_counts = data["message_counts"]
+                session.message_chars = data["message_chars"]
+            else:
+                # Older files only have the history itself to count from
+                for entry in history:
+                    if entry["speaker"] != "system":
+                        session._count_message(entry["speaker"], entry["text"])
+            
+            # Files written before compaction existed can hold any number of
+            # messages; bring them back within the usual bound
+            session.compact()
+            
+            for entry in history:
+                if entry["speaker"] == "system":
+                    continue
+                session._formatted_tail.append(_format_message(entry["speaker"], entry["text"]))
+                session._add_fingerprint(entry["speaker"], entry["text"])
+            
+            return session
+            
+        except Exception as e:
+            logger.error(f"Error loading conversation from {filepath}: {e}")
+            return None
+    
+    def invalidate_dict(self):
+        """Drop the cached to_dict() snapshot after changing a field it reports."""
+        self._dict_cache = None
+    
     def to_dict(self):
         """
         Convert the session to a dictionary.
         
+        The snapshot is cached until invalidate_dict() is called, which
+        every writer of a reported field does; callers must not modify
+        the returned dictionary.
+        
         Returns:
             dict: Dictionary representation of the session
         """
+        if self._dict_cache is None:
+            self._dict_cache = self._build_dict()
+        return self._dict_cache
+    
+    def _build_dict(self):
+        """Build a fresh to_dict() snapshot."""
         return {
             "session_id": self.session_id,
             "client_id": self.client_id,
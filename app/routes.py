@@ -5,14 +5,61 @@ Primarily used for serving static files like audio responses.
 
 import os
 import json
+import time
 import logging
+import mimetypes
+from collections import OrderedDict
+from urllib.parse import quote
+import orjson
+from eventlet import tpool
 from flask import send_from_directory, jsonify, current_app, request, Response
+from werkzeug.utils import safe_join
 
 # Import state manager
-from app.state_manager import InterviewStateManager
+from app.state_manager import state_manager
 
 logger = logging.getLogger("interview-server")
-state_manager = InterviewStateManager()
+
+# Cache for served response audio, keyed by (path, mtime, size)
+response_audio_cache = OrderedDict()
+RESPONSE_CACHE_SIZE = 64  # Maximum number of cached audio files
+RESPONSE_CACHE_TTL = 300  # Seconds before a cached file is read again
+
+# Serialized /status body, reused for STATUS_CACHE_TTL seconds
+_status_cache = {'expires': 0.0, 'body': None}
+STATUS_CACHE_TTL = 1.0
+
+def _get_response_audio(filepath, file_stat):
+    """
+    Get the contents of a response audio file, using the cache when possible.
+    
+    Args:
+        filepath (str): Path to the audio file
+        file_stat (os.stat_result): Result of stat() on the file
+        
+    Returns:
+        tuple: (file contents as bytes, ETag string)
+    """
+    key = (filepath, file_stat.st_mtime_ns, file_stat.st_size)
+    now = time.monotonic()
+    
+    # Serve from cache if the entry is still fresh
+    entry = response_audio_cache.get(key)
+    if entry is not None and now - entry[0] < RESPONSE_CACHE_TTL:
+        response_audio_cache.move_to_end(key)
+        return entry[1], entry[2]
+    
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    etag = f"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"
+    
+    # Add to cache with LRU eviction
+    response_audio_cache[key] = (now, data, etag)
+    response_audio_cache.move_to_end(key)
+    while len(response_audio_cache) > RESPONSE_CACHE_SIZE:
+        response_audio_cache.popitem(last=False)
+    
+    return data, etag
 
 def register_routes(app):
     """Register HTTP routes with the Flask app."""
@@ -23,7 +70,7 @@ def register_routes(app):
         return jsonify({
             "name": "VR Interview Practice Server",
             "status": "running",
-            "active_sessions": len(state_manager.get_active_sessions()),
+            "active_sessions": state_manager.count_active_sessions(),
             "websocket_url": f"ws://{request.host}"
         })
     
@@ -39,7 +86,43 @@ def register_routes(app):
             Response: The audio file
         """
         try:
-            return send_from_directory(current_app.config['RESPONSE_FOLDER'], filename)
+            filepath = safe_join(current_app.config['RESPONSE_FOLDER'], filename)
+            if filepath is None:
+                return "File not found", 404
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            
+            # Let nginx send the file from an internal location, e.g.
+            #   location /_protected/responses/ { internal; alias /path/to/responses/; }
+            x_accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+            if x_accel_prefix:
+                response = Response(mimetype=mimetype)
+                response.headers['X-Accel-Redirect'] = f"{x_accel_prefix.rstrip('/')}/{quote(filename)}"
+                return response
+            
+            # With USE_X_SENDFILE, Flask answers with an X-Sendfile header for
+            # Apache/lighttpd instead of streaming the file itself
+            if current_app.config.get('USE_X_SENDFILE'):
+                return send_from_directory(
+                    os.path.abspath(current_app.config['RESPONSE_FOLDER']), filename,
+                    conditional=True, etag=True
+                )
+            
+            try:
+                file_stat = os.stat(filepath)
+            except FileNotFoundError:
+                return "File not found", 404
+            
+            data, etag = _get_response_audio(filepath, file_stat)
+            
+            response = Response(data, mimetype=mimetype)
+            response.set_etag(etag)
+            response.cache_control.public = True
+            response.cache_control.max_age = RESPONSE_CACHE_TTL
+            
+            # Answers If-None-Match with 304 Not Modified and Range requests
+            # with 206 Partial Content, which audio seeking relies on
+            return response.make_conditional(request, accept_ranges=True,
+                                             complete_length=len(data))
         except Exception as e:
             logger.error(f"Error serving response file {filename}: {e}")
             return "File not found", 404
@@ -53,16 +136,21 @@ def register_routes(app):
             Response: Server status in JSON format
         """
         try:
-            active_sessions = state_manager.get_active_sessions()
-            
-            # Collect basic stats
-            status_data = {
-                "status": "running",
-                "active_sessions": len(active_sessions),
-                "session_details": [session.to_dict() for session in active_sessions]
-            }
+            now = time.monotonic()
+            if _status_cache['body'] is None or now >= _status_cache['expires']:
+                active_sessions = state_manager.get_active_sessions()
+                
+                # Collect basic stats
+                status_data = {
+                    "status": "running",
+                    "active_sessions": len(active_sessions),
+                    "session_details": [session.to_dict() for session in active_sessions]
+                }
+                
+                _status_cache['body'] = orjson.dumps(status_data)
+                _status_cache['expires'] = now + STATUS_CACHE_TTL
             
-            return jsonify(status_data)
+            return Response(_status_cache['body'], mimetype='application/json')
             
         except Exception as e:
             logger.error(f"Error getting server status: {e}")
@@ -115,8 +203,9 @@ def register_routes(app):
             filename = f"{session_id}_{int(session.last_activity)}.json"
             filepath = os.path.join(current_app.config['CONVERSATION_FOLDER'], filename)
             
-            # Save conversation
-            success = session.save_conversation(filepath)
+            # Save conversation on a native thread so the eventlet hub keeps
+            # serving other clients during the disk write
+            success = tpool.execute(session.save_conversation, filepath)
             
             if success:
                 return jsonify({
@@ -2,22 +2,41 @@
 Manages interview session states and provides session management functionality.
 """
 
+import os
 import time
+import heapq
 import logging
-import threading
 import eventlet
+from eventlet import tpool
+from eventlet.event import Event
 
 # Import interview session class
 from app.interview_session import InterviewSession
 
 logger = logging.getLogger("interview-server")
 
+# Interviewer line used when a session is recovered from a stuck processing state
+RECOVERY_FALLBACK_TEXT = "Thank you for your question. Let me think about that for a moment. Could you tell me more about your experience in this field while I formulate my thoughts?"
+
+# Personality prompt used for interviewer types missing from the config
+DEFAULT_INTERVIEWER_PROMPT = "You are a professional job interviewer. You're conducting an interview for the specified position. Keep your responses concise and ask thoughtful follow-up questions."
+
+# Seconds a session may stay in processing before it is recovered
+PROCESSING_TIMEOUT = 40
+
+# Invariant part of the response_ready payload sent on recovery
+_RECOVERY_PAYLOAD = {
+    'text': RECOVERY_FALLBACK_TEXT,
+    'audio_url': '',
+    'is_recovery': True
+}
+
 class InterviewStateManager:
     """
     Manages the state of all active interview sessions.
     
-    A singleton class that maintains the collection of active sessions
-    and handles state transitions.
+    A single instance, state_manager, is created at import time and
+    maintains the collection of active sessions and handles state transitions.
     """
     
     # Session state constants
@@ -28,125 +47,288 @@ class InterviewStateManager:
     STATE_WAITING = "waiting"        # Waiting for the next turn
     STATE_ERROR = "error"            # Error state
     
-    _instance = None
-    _lock = threading.Lock()
+    def __init__(self):
+        """Initialize the state manager."""
+        self.active_sessions = {}  # Dictionary of active sessions by session_id
+        self.client_sessions = {}  # Dictionary of sessions by client_id
+        self._active_ids = set()  # IDs of sessions that are still active
+        self.session_rooms = {}  # Set of client IDs in each session's room
+        self.processing_sessions = {}  # state_timestamp of active sessions in processing
+        self._processing_deadlines = []  # (deadline, session_id, state_timestamp) min-heap
+        self._have_deadlines = Event()  # Sent when the deadline heap becomes non-empty
+        self._inactive_heap = []  # (last_activity, session_id) of inactive sessions
+        self.archived_index = {}  # (archive file path, last_activity) by session_id
+        self.archive_folder = None  # Archiving is disabled until configured
+        self.archive_after = 300  # Seconds an inactive session stays in memory
+        self.socketio = None
+        self.default_position = "Software Engineer"
+        self.default_difficulty = 0.5
+        self.interviewer_prompts = {}  # Personality prompt by interviewer type
+        self.upload_folder = "data/audio/uploads"
+        self.worker_config = {}  # Folders and app config sent with worker tasks
+        self._have_sessions = Event()  # Sent when a session becomes active
+        self._archive_thread = None  # Started by configure_archive
+        logger.info("Interview State Manager initialized")
+        
+        # Start broadcasting using eventlet greenthread (not normal thread)
+        # This is more compatible with Windows. Processes that only import
+        # the manager can opt out with ENABLE_STATE_BROADCAST=0.
+        if os.environ.get('ENABLE_STATE_BROADCAST', '1') == '1':
+            eventlet.spawn(self._broadcast_states)
+            logger.info("Started state broadcast greenthread")
+        
+        # Recovery of sessions stuck in processing; opt out with
+        # ENABLE_PROCESSING_WATCH=0
+        self._watch_enabled = os.environ.get('ENABLE_PROCESSING_WATCH', '1') == '1'
+        if self._watch_enabled:
+            eventlet.spawn(self._watch_processing)
+            logger.info("Started processing watch greenthread")
     
-    def __new__(cls):
-        """Ensure singleton pattern."""
-        with cls._lock:
-            if cls._instance is None:
-                cls._instance = super(InterviewStateManager, cls).__new__(cls)
-                # Initialize the instance
-                cls._instance._initialize()
+    def _broadcast_states(self):
+        """
+        Periodically broadcast session states to clients.
+        
+        Emits can yield to other greenthreads that add or remove sessions,
+        so the loop iterates over a snapshot of the active session IDs.
+        """
+        while True:
+            try:
+                # With no active sessions, sleep until one is added instead
+                # of waking every tick
+                if not self._active_ids:
+                    self._have_sessions.wait()
+                    self._have_sessions = Event()
                 
-                # Use eventlet for broadcasting state updates
-                # This is more compatible with Windows
-                def broadcast_states():
-                    """Periodically broadcast session states to clients"""
-                    while True:
-                        try:
-                            # Sleep with longer interval to reduce log spam
-                            eventlet.sleep(20)
-                            
-                            # Skip if socketio is not available
-                            if not hasattr(cls._instance, 'socketio') or cls._instance.socketio is None:
-                                continue
-                            
-                            # Process each active session
-                            for session_id, session in cls._instance.active_sessions.items():
-                                if not session.active:
-                                    continue
-                                    
-                                try:
-                                    # Send state update silently (no logging)
-                                    cls._instance.socketio.emit('state_update', {
-                                        'session_id': session_id,
-                                        'state': session.state,
-                                        'turn': session.turn_index,
-                                        'previous_state': session.state
-                                    }, room=session_id)
-                                    # Debug broadcast message removed
-                                    
-                                    # Send explicit state update
-                                    cls._instance.socketio.emit('explicit_state_update', {
-                                        'session_id': session_id,
-                                        'state': session.state,
-                                        'turn': session.turn_index,
-                                        'previous_state': session.state
-                                    }, room=session_id)
-                                    
-                                    # Process stuck sessions
-                                    if session.state == 'processing' and hasattr(session, 'state_timestamp'):
-                                        stuck_time = time.time() - session.state_timestamp
-                                        
-                                        # Auto-recover after 40 seconds
-                                        if stuck_time > 40:
-                                            logger.warning(f"Session {session_id} stuck in processing state for >40s - auto-recovering")
-                                            
-                                            # Create fallback response
-                                            fallback_response = "Thank you for your question. Let me think about that for a moment. Could you tell me more about your experience in this field while I formulate my thoughts?"
-                                            
-                                            # Add to conversation history
-                                            session.add_message("interviewer", fallback_response)
-                                            
-                                            # Force state change
-                                            cls._instance.update_session_state(session_id, 'waiting')
-                                            
-                                            # Send recovery signals
-                                            cls._instance.socketio.emit('response_ready', {
-                                                'session_id': session_id,
-                                                'text': fallback_response,
-                                                'audio_url': '',
-                                                'is_recovery': True
-                                            }, room=session_id)
-                                            
-                                            # Also send direct state update
-                                            cls._instance.socketio.emit('explicit_state_update', {
-                                                'session_id': session_id,
-                                                'state': 'waiting',
-                                                'turn': session.turn_index,
-                                                'previous_state': 'processing'
-                                            }, room=session_id)
-                                            
-                                            # Signal ready for next input
-                                            cls._instance.socketio.emit('ready_for_next_input', {
-                                                'session_id': session_id,
-                                                'state': 'waiting',
-                                                'turn': session.turn_index
-                                            }, room=session_id)
-                                            
-                                    # For waiting state, always send ready_for_next_input
-                                    if session.state == 'waiting':
-                                        cls._instance.socketio.emit('ready_for_next_input', {
-                                            'session_id': session_id,
-                                            'state': 'waiting',
-                                            'turn': session.turn_index
-                                        }, room=session_id)
-                                        # Debug broadcast message removed
-                                        
-                                except Exception as e:
-                                    logger.error(f"Error broadcasting state for session {session_id}: {e}")
-                                    
-                        except Exception as e:
-                            logger.error(f"Error in state broadcast greenthread: {e}")
+                # Sleep with longer interval to reduce log spam
+                eventlet.sleep(20)
                 
-                # Start broadcasting using eventlet greenthread (not normal thread)
-                eventlet.spawn(broadcast_states)
-                logger.info("Started state broadcast greenthread")
+                # Skip if socketio is not available; __init__ always sets it
+                if self.socketio is None:
+                    continue
                 
-            return cls._instance
+                # Send one state snapshot per active session per tick; the
+                # transition events are sent by update_session_state
+                for session_id in list(self._active_ids):
+                    session = self.active_sessions.get(session_id)
+                    if session is None:
+                        continue
+                    
+                    try:
+                        self.emit_to_session('state_update', {
+                            'session_id': session_id,
+                            'state': session.state,
+                            'turn': session.turn_index,
+                            'previous_state': session.state
+                        }, session)
+                    except Exception as e:
+                        logger.error(f"Error broadcasting state for session {session_id}: {e}")
+                        
+            except Exception as e:
+                logger.error(f"Error in state broadcast greenthread: {e}")
     
-    def _initialize(self):
-        """Initialize the state manager."""
-        self.active_sessions = {}  # Dictionary of active sessions by session_id
-        self.client_sessions = {}  # Dictionary of session_ids by client_id
-        self.socketio = None
-        logger.info("Interview State Manager initialized")
+    def _watch_processing(self):
+        """
+        Recover sessions that stay in processing past PROCESSING_TIMEOUT.
+        
+        Sleeps until the earliest deadline, or until a session enters
+        processing when none is pending. Deadlines are pushed in time
+        order, so a new one never precedes the one being slept on.
+        """
+        while True:
+            try:
+                if not self._processing_deadlines:
+                    self._have_deadlines.wait()
+                    self._have_deadlines = Event()
+                    continue
+                
+                deadline, session_id, started = self._processing_deadlines[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    eventlet.sleep(delay)
+                    continue
+                heapq.heappop(self._processing_deadlines)
+                
+                # A session that has left processing since, or entered it
+                # again, no longer matches the entry's timestamp
+                if self.processing_sessions.get(session_id) != started:
+                    continue
+                
+                # Recovery is attempted once per stay in processing
+                del self.processing_sessions[session_id]
+                session = self.active_sessions.get(session_id)
+                if session is None:
+                    continue
+                
+                try:
+                    logger.warning("Session %s stuck in processing state for %ds - auto-recovering",
+                                   session_id, int(time.monotonic() - started))
+                    
+                    # Add the fallback response to conversation history
+                    session.add_message("interviewer", RECOVERY_FALLBACK_TEXT)
+                    
+                    # Give up on the pipeline run, then force the state
+                    # change and send the recovery response
+                    self.release_processing(session)
+                    self.deliver_response(session, _RECOVERY_PAYLOAD)
+                except Exception as e:
+                    logger.error(f"Error recovering session {session_id}: {e}")
+                    
+            except Exception as e:
+                logger.error(f"Error in processing watch greenthread: {e}")
+                eventlet.sleep(1)
+    
+    def _archive_sessions(self):
+        """Periodically move idle inactive sessions to disk"""
+        while True:
+            try:
+                eventlet.sleep(60)
+                self.archive_idle_sessions()
+            except Exception as e:
+                logger.error(f"Error in session archive greenthread: {e}")
     
     def set_socketio(self, socketio_instance):
         """Set the SocketIO instance for sending updates."""
         self.socketio = socketio_instance
     
+    def init_config(self, app):
+        """
+        Cache the configuration values read by event handlers.
+        
+        The configuration does not change after startup, so handlers use
+        these attributes instead of walking app.config on every event.
+        
+        Args:
+            app (Flask): The configured Flask app
+        """
+        app_config = app.config.get('APP_CONFIG', {})
+        interview_config = app_config.get('interview', {})
+        
+        self.default_position = interview_config.get('default_position', "Software Engineer")
+        self.default_difficulty = interview_config.get('default_difficulty', 0.5)
+        self.interviewer_prompts = interview_config.get('interviewer_types', {})
+        self.upload_folder = app.config['UPLOAD_FOLDER']
+        self.worker_config = {
+            'UPLOAD_FOLDER': app.config['UPLOAD_FOLDER'],
+            'RESPONSE_FOLDER': app.config['RESPONSE_FOLDER'],
+            'APP_CONFIG': app_config
+        }
+    
+    def get_personality_prompt(self, interviewer_type):
+        """
+        Resolve the personality prompt for an interviewer type.
+        
+        Args:
+            interviewer_type (str): Type of interviewer
+            
+        Returns:
+            str: The configured prompt, or the professional/default prompt
+                for unknown types
+        """
+        prompt = self.interviewer_prompts.get(interviewer_type)
+        if prompt is None:
+            prompt = self.interviewer_prompts.get('professional', DEFAULT_INTERVIEWER_PROMPT)
+        return prompt
+    
+    def configure_archive(self, archive_folder, archive_after=300):
+        """
+        Enable archiving of idle inactive sessions to disk.
+        
+        Args:
+            archive_folder (str): Directory for archived session files
+            archive_after (int): Seconds of inactivity before a session is archived
+        """
+        os.makedirs(archive_folder, exist_ok=True)
+        self.archive_folder = archive_folder
+        self.archive_after = archive_after
+        
+        # The archive greenthread only runs once archiving is configured
+        if self._archive_thread is None:
+            self._archive_thread = eventlet.spawn(self._archive_sessions)
+    
+    def join_session_room(self, session_id, client_id):
+        """
+        Record that a client joined a session's Socket.IO room.
+        
+        Args:
+            session_id (str): The session ID (room name)
+            client_id (str): The client ID
+        """
+        self.session_rooms.setdefault(session_id, set()).add(client_id)
+    
+    def rebind_client(self, session, client_id):
+        """
+        Attach a session to a new client, e.g. a client that reconnected.
+        
+        Args:
+            session (InterviewSession): The session
+            client_id (str): The new client ID
+        """
+        # The session created for the joining client on connect is
+        # replaced; retire it so it is cleaned up like any inactive session
+        previous = self.client_sessions.get(client_id)
+        if previous is not None and previous is not session:
+            self.mark_session_inactive(previous.session_id)
+            self.leave_session_room(previous.session_id, client_id)
+        
+        # The old client's disconnect no longer finds this session, so its
+        # room membership is dropped here
+        old_client_id = session.client_id
+        if old_client_id is not None and old_client_id != client_id:
+            if self.client_sessions.get(old_client_id) is session:
+                del self.client_sessions[old_client_id]
+            self.leave_session_room(session.session_id, old_client_id)
+        
+        session.client_id = client_id
+        self.client_sessions[client_id] = session
+        
+        # A client is using the session again, e.g. one restored from the
+        # archive, so it must not be archived or cleaned up meanwhile
+        if not session.active:
+            session.active = True
+            self._active_ids.add(session.session_id)
+            if not self._have_sessions.ready():
+                self._have_sessions.send()
+            
+            # Going inactive dropped it from the stuck-session check
+            if session.state == self.STATE_PROCESSING:
+                self._track_processing(session)
+        session.invalidate_dict()
+    
+    def leave_session_room(self, session_id, client_id):
+        """
+        Record that a client left a session's Socket.IO room.
+        
+        Args:
+            session_id (str): The session ID (room name)
+            client_id (str): The client ID
+        """
+        members = self.session_rooms.get(session_id)
+        if members:
+            members.discard(client_id)
+            if not members:
+                del self.session_rooms[session_id]
+    
+    def emit_to_session(self, event, payload, session):
+        """
+        Emit an event to a session's client, or to the session's room when
+        several clients have joined it.
+        
+        Sessions normally have a single client, which is addressed by its
+        sid directly. The target is never None, so nothing is ever
+        broadcast to every connected client.
+        
+        Args:
+            event (str): Event name
+            payload (dict): Event payload
+            session (InterviewSession): The target session
+        """
+        client_id = session.client_id
+        members = self.session_rooms.get(session.session_id, ())
+        if client_id and (len(members) <= 1 or client_id not in members):
+            self.socketio.emit(event, payload, to=client_id)
+        else:
+            self.socketio.emit(event, payload, room=session.session_id)
+    
     def add_session(self, session):
         """
         Add a new session to the manager.
@@ -155,8 +337,14 @@ class InterviewStateManager:
             session (InterviewSession): The session to add
         """
         self.active_sessions[session.session_id] = session
+        if session.active:
+            self._active_ids.add(session.session_id)
+            if not self._have_sessions.ready():
+                self._have_sessions.send()
+        else:
+            heapq.heappush(self._inactive_heap, (session.last_activity, session.session_id))
         if session.client_id:
-            self.client_sessions[session.client_id] = session.session_id
+            self.client_sessions[session.client_id] = session
     
     def get_session(self, session_id):
         """
@@ -169,6 +357,8 @@ class InterviewStateManager:
             InterviewSession or None: The session if found, None otherwise
         """
         session = self.active_sessions.get(session_id)
+        if session is None and session_id in self.archived_index:
+            session = self._restore_session(session_id)
         return session
     
     def get_session_by_client_id(self, client_id):
@@ -181,10 +371,7 @@ class InterviewStateManager:
         Returns:
             InterviewSession or None: The session if found, None otherwise
         """
-        session_id = self.client_sessions.get(client_id)
-        if session_id:
-            return self.active_sessions.get(session_id)
-        return None
+        return self.client_sessions.get(client_id)
     
     def remove_session(self, session_id):
         """
@@ -193,11 +380,90 @@ class InterviewStateManager:
         Args:
             session_id (str): The session ID
         """
-        session = self.active_sessions.get(session_id)
-        if session:
-            if session.client_id in self.client_sessions:
+        session = self.active_sessions.pop(session_id, None)
+        if session is not None:
+            if self.client_sessions.get(session.client_id) is session:
+                del self.client_sessions[session.client_id]
+            self._active_ids.discard(session_id)
+        self.session_rooms.pop(session_id, None)
+        self.processing_sessions.pop(session_id, None)
+        
+        archived = self.archived_index.pop(session_id, None)
+        if archived:
+            try:
+                os.remove(archived[0])
+            except OSError as e:
+                logger.warning(f"Could not remove archived session file {archived[0]}: {e}")
+    
+    def archive_idle_sessions(self):
+        """
+        Move inactive sessions that have been idle too long to disk.
+        
+        Archived sessions are dropped from memory and restored on demand
+        by get_session.
+        
+        Returns:
+            int: Number of sessions archived
+        """
+        if self.archive_folder is None:
+            return 0
+        
+        current_time = time.time()
+        archived_count = 0
+        for session_id, session in list(self.active_sessions.items()):
+            if session.active or (current_time - session.last_activity) <= self.archive_after:
+                continue
+            
+            filepath = os.path.join(self.archive_folder, f"{session_id}.json")
+            # Write on a native thread so the hub is not blocked by disk I/O
+            if not tpool.execute(session.save_conversation, filepath):
+                continue
+            
+            # Other greenthreads ran during the save; the session may have
+            # been removed, rejoined or used since, in which case it stays
+            if (self.active_sessions.get(session_id) is not session or session.active
+                    or (time.time() - session.last_activity) <= self.archive_after):
+                try:
+                    os.remove(filepath)
+                except OSError as e:
+                    logger.warning(f"Could not remove archived session file {filepath}: {e}")
+                continue
+            
+            # Drop the in-memory copy
+            if self.client_sessions.get(session.client_id) is session:
                 del self.client_sessions[session.client_id]
-            del self.active_sessions[session_id]
+            self.active_sessions.pop(session_id, None)
+            self.archived_index[session_id] = (filepath, session.last_activity)
+            archived_count += 1
+        
+        if archived_count:
+            logger.info(f"Archived {archived_count} idle sessions")
+        
+        return archived_count
+    
+    def _restore_session(self, session_id):
+        """
+        Load an archived session back into memory.
+        
+        Args:
+            session_id (str): The session ID
+            
+        Returns:
+            InterviewSession or None: The restored session, or None if failed
+        """
+        filepath, _ = self.archived_index.pop(session_id)
+        session = InterviewSession.load_conversation(filepath)
+        if session is None:
+            return None
+        
+        self.active_sessions[session_id] = session
+        try:
+            os.remove(filepath)
+        except OSError as e:
+            logger.warning(f"Could not remove archived session file {filepath}: {e}")
+        
+        logger.info(f"Restored archived session {session_id}")
+        return session
     
     def mark_session_inactive(self, session_id):
         """
@@ -210,14 +476,25 @@ class InterviewStateManager:
         if session:
             session.active = False
             session.last_activity = time.time()
+            session.invalidate_dict()
+            session.release_audio_buffer()
+            # The client is gone; its sid is never reused
+            if self.client_sessions.get(session.client_id) is session:
+                del self.client_sessions[session.client_id]
+            self._active_ids.discard(session_id)
+            self.processing_sessions.pop(session_id, None)
+            heapq.heappush(self._inactive_heap, (session.last_activity, session_id))
     
-    def update_session_state(self, session_id, new_state):
+    def update_session_state(self, session_id, new_state, emit=True):
         """
         Update the state of a session and notify clients.
         
         Args:
             session_id (str): The session ID
             new_state (str): The new state
+            emit (bool, optional): Whether to send state_update to the client.
+                Pass False when the state is folded into another event.
+                Defaults to True.
         
         Returns:
             bool: True if successful, False otherwise
@@ -227,49 +504,134 @@ class InterviewStateManager:
             logger.warning(f"Attempt to update non-existent session: {session_id}")
             return False
         
-        # Debug state flow message removed
+        self.set_session_state(session, new_state, emit)
+        return True
+    
+    def set_session_state(self, session, new_state, emit=True):
+        """
+        Update the state of a session the caller already holds and notify clients.
         
-        # Log state transition
-        logger.info(f"Session {session_id} state change: {session.state} -> {new_state}")
+        Handlers that have just fetched the session use this instead of
+        update_session_state to skip a second lookup by ID.
+        
+        Args:
+            session (InterviewSession): The session
+            new_state (str): The new state
+            emit (bool, optional): Whether to send state_update to the client.
+                Defaults to True.
+        """
+        session_id = session.session_id
+        
+        # Log state transition; %-style so the message is only formatted
+        # when INFO is enabled, as this runs on every transition
+        logger.info("Session %s state change: %s -> %s", session_id, session.state, new_state)
         
         # Update session state
         old_state = session.state
         session.state = new_state
         session.last_activity = time.time()
-        session.state_timestamp = time.time()  # Add state timestamp for timing tracking
+        session.state_timestamp = time.monotonic()  # Monotonic, only used for elapsed time
+        session.invalidate_dict()
+        
+        # Index active sessions in processing and queue their recovery
+        # deadline for the watch greenthread
+        if new_state == self.STATE_PROCESSING and session.active:
+            self._track_processing(session)
+        else:
+            self.processing_sessions.pop(session_id, None)
         
         # Send state update to client using nonblocking approach
-        if hasattr(self, 'socketio') and self.socketio:
+        if emit and self.socketio is not None:
             try:
-                self.socketio.emit('state_update', {
+                payload = {
                     'session_id': session_id,
                     'state': new_state,
                     'turn': session.turn_index,
                     'previous_state': old_state
-                }, room=session_id)
-                # Debug event message removed
-                
-                # Also send an explicit state update
-                self.socketio.emit('explicit_state_update', {
-                    'session_id': session_id,
-                    'state': new_state,
-                    'turn': session.turn_index,
-                    'previous_state': old_state
-                }, room=session_id)
+                }
+                self.emit_to_session('state_update', payload, session)
                 # Debug event message removed
                 
                 # If transitioning to waiting state, send ready_for_next_input
                 if new_state == 'waiting':
-                    self.socketio.emit('ready_for_next_input', {
+                    self.emit_to_session('ready_for_next_input', {
                         'session_id': session_id,
                         'state': new_state,
                         'turn': session.turn_index
-                    }, room=session_id)
+                    }, session)
                     # Debug event message removed
             except Exception as e:
                 logger.error(f"Error sending state update: {e}")
+    
+    def _track_processing(self, session):
+        """
+        Index a session in processing and queue its recovery deadline.
         
-        return True
+        The deadline counts from when the session entered processing.
+        
+        Args:
+            session (InterviewSession): An active session in processing
+        """
+        started = session.state_timestamp
+        self.processing_sessions[session.session_id] = started
+        if self._watch_enabled:
+            heapq.heappush(self._processing_deadlines,
+                           (started + PROCESSING_TIMEOUT, session.session_id, started))
+            if not self._have_deadlines.ready():
+                self._have_deadlines.send()
+    
+    def deliver_response(self, session, response, advance_turn=False):
+        """
+        Move a session to waiting and send its response in one event.
+        
+        The new state and turn are folded into the response_ready payload
+        instead of sending a separate state_update, followed by a single
+        ready_for_next_input.
+        
+        Args:
+            session (InterviewSession): The session being answered
+            response (dict): Response fields (text, audio_url, ...)
+            advance_turn (bool, optional): Whether this response completes
+                a turn. Defaults to False.
+        """
+        previous_state = session.state
+        if advance_turn:
+            session.turn_index += 1
+        
+        self.set_session_state(session, self.STATE_WAITING, emit=False)
+        
+        if self.socketio is None:
+            return
+        
+        try:
+            self.emit_to_session('response_ready', {
+                **response,
+                'session_id': session.session_id,
+                'state': self.STATE_WAITING,
+                'turn': session.turn_index,
+                'previous_state': previous_state
+            }, session)
+            self.emit_to_session('ready_for_next_input', {
+                'session_id': session.session_id,
+                'state': self.STATE_WAITING,
+                'turn': session.turn_index
+            }, session)
+        except Exception as e:
+            logger.error(f"Error sending response: {e}")
+    
+    def release_processing(self, session):
+        """
+        End a session's pipeline run.
+        
+        The processing lock is released if it is held, and results still
+        to come from the run's worker task will be dropped as stale.
+        
+        Args:
+            session (InterviewSession): The session
+        """
+        session.task_id = None
+        if session.process_lock.locked():
+            session.process_lock.release()
     
     def reset_session(self, session_id):
         """
@@ -286,10 +648,14 @@ class InterviewStateManager:
             return False
         
         # Reset session properties
+        session.discard_recording()
         session.state = self.STATE_IDLE
+        self.processing_sessions.pop(session_id, None)
+        self.release_processing(session)
         session.turn_index = 0
-        session.conversation_history = []
+        session.clear_history()
         session.last_activity = time.time()
+        session.invalidate_dict()
         
         return True
     
@@ -300,7 +666,16 @@ class InterviewStateManager:
         Returns:
             list: List of active sessions
         """
-        return [s for s in self.active_sessions.values() if s.active]
+        return [self.active_sessions[session_id] for session_id in self._active_ids]
+    
+    def count_active_sessions(self):
+        """
+        Get the number of active sessions.
+        
+        Returns:
+            int: Number of active sessions
+        """
+        return len(self._active_ids)
     
     def get_inactive_sessions(self, timeout=1800):
         """
@@ -312,11 +687,37 @@ class InterviewStateManager:
         Returns:
             list: List of inactive session IDs
         """
-        current_time = time.time()
-        return [
-            session_id for session_id, session in self.active_sessions.items()
-            if not session.active and (current_time - session.last_activity) > timeout
-        ]
+        # Only the oldest entries of the heap need to be looked at. Entries
+        # are checked against the current session, since a session may have
+        # been removed or touched again after it was pushed.
+        cutoff = time.time() - timeout
+        heap = self._inactive_heap
+        inactive = []
+        while heap and heap[0][0] < cutoff:
+            pushed_activity, session_id = heapq.heappop(heap)
+            
+            session = self.active_sessions.get(session_id)
+            if session is not None:
+                if session.active:
+                    continue
+                last_activity = session.last_activity
+            elif session_id in self.archived_index:
+                last_activity = self.archived_index[session_id][1]
+            else:
+                continue
+            
+            if last_activity != pushed_activity:
+                heapq.heappush(heap, (last_activity, session_id))
+            elif session_id not in inactive:
+                inactive.append(session_id)
+        
+        # Keep reported sessions indexed until they are actually removed
+        for session_id in inactive:
+            session = self.active_sessions.get(session_id)
+            last_activity = session.last_activity if session else self.archived_index[session_id][1]
+            heapq.heappush(heap, (last_activity, session_id))
+        
+        return inactive
     
     def cleanup_inactive_sessions(self, timeout=1800):
         """
@@ -335,4 +736,7 @@ class InterviewStateManager:
         if inactive_sessions:
             logger.info(f"Cleaned up {len(inactive_sessions)} inactive sessions")
         
-        return len(inactive_sessions)
\ No newline at end of file
+        return len(inactive_sessions)
+
+# Shared state manager instance
+state_manager = InterviewStateManager()
@@ -4,32 +4,26 @@ Includes helper functions for session management, audio processing, etc.
 """
 
 import os
-import time
 import logging
-import threading
-import wave
-import array
-import numpy as np
+import eventlet
 from datetime import datetime, timedelta
 
 # Import state manager
-from app.state_manager import InterviewStateManager
+from app.state_manager import state_manager
 
 logger = logging.getLogger("interview-server")
-state_manager = InterviewStateManager()
 
-def cleanup_inactive_sessions(timeout=1800):
+def _cleanup_loop(timeout):
     """
     Periodically clean up inactive sessions.
-    This function runs in a separate thread.
     
     Args:
-        timeout (int): Session timeout in seconds (default: 1800 = 30 minutes)
+        timeout (int): Session timeout in seconds
     """
     while True:
         try:
             # Sleep first to allow the server to start up
-            time.sleep(300)  # Run every 5 minutes
+            eventlet.sleep(300)  # Run every 5 minutes
             
             # Clean up inactive sessions
             removed_count = state_manager.cleanup_inactive_sessions(timeout)
@@ -39,11 +33,26 @@ def cleanup_inactive_sessions(timeout=1800):
         except Exception as e:
             logger.error(f"Error in cleanup_inactive_sessions: {e}")
 
+def start_cleanup_greenthread(timeout=1800):
+    """
+    Start cleaning up inactive sessions in a greenthread.
+    
+    Args:
+        timeout (int): Session timeout in seconds (default: 1800 = 30 minutes)
+        
+    Returns:
+        GreenThread: The cleanup greenthread
+    """
+    return eventlet.spawn(_cleanup_loop, timeout)
+
 def convert_audio_format(input_path, output_path, target_sample_rate=16000):
     """
     Convert audio file format (resampling, etc.).
     Useful for preparing audio for specific models.
     
+    The file is processed in blocks of about one second, so memory use does
+    not depend on the length of the recording.
+    
     Args:
         input_path (str): Path to input audio file
         output_path (str): Path to output audio file
@@ -53,46 +62,98 @@ def convert_audio_format(input_path, output_path, target_sample_rate=16000):
         bool: True if successful, False otherwise
     """
     try:
-        # Open input file
-        with wave.open(input_path, 'rb') as wf:
+        # Audio dependencies are only loaded by processes that convert audio
+        import wave
+        import numpy as np
+        from math import gcd
+        from scipy.signal import resample_poly
+        
+        with wave.open(input_path, 'rb') as wf_in:
             # Get parameters
-            n_channels = wf.getnchannels()
-            sample_width = wf.getsampwidth()
-            sample_rate = wf.getframerate()
-            n_frames = wf.getnframes()
+            n_channels = wf_in.getnchannels()
+            sample_width = wf_in.getsampwidth()
+            sample_rate = wf_in.getframerate()
             
-            # Read all frames
-            frames = wf.readframes(n_frames)
-        
-        # Convert to numpy array
-        if sample_width == 2:
-            data = np.frombuffer(frames, dtype=np.int16)
-        elif sample_width == 4:
-            data = np.frombuffer(frames, dtype=np.int32)
-        else:
-            logger.error(f"Unsupported sample width: {sample_width}")
-            return False
-        
-        # Reshape for multiple channels
-        if n_channels > 1:
-            data = data.reshape(-1, n_channels)
-            # Convert to mono by averaging channels
-            data = data.mean(axis=1).astype(data.dtype)
-        
-        # Resample if necessary
-        if sample_rate != target_sample_rate:
-            # Simple resampling - for better results, use a library like librosa
-            duration = n_frames / sample_rate
-            target_n_frames = int(duration * target_sample_rate)
-            indices = np.linspace(0, len(data) - 1, target_n_frames).astype(int)
-            data = data[indices]
-        
-        # Write output file
-        with wave.open(output_path, 'wb') as wf:
-            wf.setnchannels(1)  # Mono
-            wf.setsampwidth(2)  # 16-bit
-            wf.setframerate(target_sample_rate)
-            wf.writeframes(data.tobytes())
+            if sample_width == 2:
+                dtype = np.int16
+                acc_dtype = np.int32
+            elif sample_width == 4:
+                dtype = np.int32
+                acc_dtype = np.int64
+            else:
+                logger.error(f"Unsupported sample width: {sample_width}")
+                return False
+            
+            # Output is always 16-bit; wider samples are scaled down
+            scale = 1 << (8 * (sample_width - 2))
+            limits = np.iinfo(np.int16)
+            
+            # Resampling ratio, and the input context each output sample
+            # depends on. Both block size and context are multiples of
+            # `down`, so block boundaries line up with output samples and
+            # the result matches resampling the whole file at once.
+            divisor = gcd(sample_rate, target_sample_rate)
+            up = target_sample_rate // divisor
+            down = sample_rate // divisor
+            pad = down * -(-10 * max(up, down) // (up * down))
+            block = down * -(-sample_rate // down)
+            
+            with wave.open(output_path, 'wb') as wf_out:
+                wf_out.setnchannels(1)  # Mono
+                wf_out.setsampwidth(2)  # 16-bit
+                wf_out.setframerate(target_sample_rate)
+                
+                pending = np.empty(0, dtype=dtype)  # Mono input not yet converted
+                pending_start = 0  # Input index of pending[0]
+                done = 0  # Input index up to which output has been written
+                at_end = False
+                
+                while not at_end:
+                    frames = wf_in.readframes(block)
+                    at_end = len(frames) < block * n_channels * sample_width
+                    
+                    data = np.frombuffer(frames, dtype=dtype)
+                    if n_channels > 1:
+                        # Convert to mono by averaging channels in integer
+                        # arithmetic, with an accumulator wide enough not to
+                        # overflow
+                        data = data.reshape(-1, n_channels)
+                        data = (data.sum(axis=1, dtype=acc_dtype) // n_channels).astype(dtype)
+                    pending = np.concatenate((pending, data))
+                    available = pending_start + len(pending)
+                    
+                    # wave takes the arrays through the buffer protocol, so
+                    # samples are written without a tobytes() copy
+                    if up == down:
+                        wf_out.writeframesraw(pending if scale == 1 else (pending // scale).astype(np.int16))
+                        pending_start = available
+                        pending = pending[:0]
+                        continue
+                    
+                    # Convert every block whose right-hand context is in
+                    # (or, at the end of the file, everything left)
+                    while done < available and (at_end or done + block + pad <= available):
+                        seg_start = max(done - pad, 0)
+                        seg_end = available if at_end else done + block + pad
+                        segment = pending[seg_start - pending_start:seg_end - pending_start]
+                        
+                        # Polyphase resampling with an anti-aliasing filter
+                        resampled = resample_poly(segment, up, down)
+                        first = (done - seg_start) * up // down
+                        count = -(-(min(done + block, available) - done) * up // down)
+                        out = resampled[first:first + count]
+                        if scale != 1:
+                            out = out / scale
+                        np.clip(out, limits.min, limits.max, out=out)
+                        wf_out.writeframesraw(out.astype(np.int16))
+                        
+                        done += block
+                        
+                        # Drop input no later block needs for context
+                        keep_from = max(done - pad, 0)
+                        if keep_from > pending_start:
+                            pending = pending[keep_from - pending_start:]
+                            pending_start = keep_from
         
         logger.info(f"Converted audio: {input_path} -> {output_path}")
         return True
@@ -116,17 +177,16 @@ def generate_session_stats(session_id):
         if not session:
             return {"error": "Session not found"}
         
-        # Calculate statistics
-        total_messages = len(session.conversation_history)
-        user_messages = sum(1 for msg in session.conversation_history if msg["speaker"] == "user")
-        interviewer_messages = total_messages - user_messages
+        # Statistics come from running totals kept by the session
+        counts = session.message_counts
+        chars = session.message_chars
+        total_messages = sum(counts.values())
+        user_messages = counts.get("user", 0)
+        interviewer_messages = counts.get("interviewer", 0)
         
         # Calculate average message length
-        user_msg_lengths = [len(msg["text"]) for msg in session.conversation_history if msg["speaker"] == "user"]
-        interviewer_msg_lengths = [len(msg["text"]) for msg in session.conversation_history if msg["speaker"] == "interviewer"]
-        
-        avg_user_length = sum(user_msg_lengths) / len(user_msg_lengths) if user_msg_lengths else 0
-        avg_interviewer_length = sum(interviewer_msg_lengths) / len(interviewer_msg_lengths) if interviewer_msg_lengths else 0
+        avg_user_length = chars.get("user", 0) / user_messages if user_messages else 0
+        avg_interviewer_length = chars.get("interviewer", 0) / interviewer_messages if interviewer_messages else 0
         
         # Calculate session duration
         if session.conversation_history:
@@ -4,19 +4,27 @@ Handles all real-time communication with VR clients.
 """
 
 import os
-import uuid
-import base64
+import secrets
 import logging
-import threading
 import time
-import json
-from flask import request, current_app
+import queue
+import functools
+import subprocess
+import heapq
+import itertools
+from collections import deque
+from flask import request
 from flask_socketio import emit, join_room, leave_room
 import eventlet
+from eventlet import tpool
 
 # Initialize state manager - must be done first
-from app.state_manager import InterviewStateManager
-state_manager = InterviewStateManager()
+from app.state_manager import state_manager
+
+# Direct reference to the in-memory session table for the audio_data hot
+# path. A listening session is always in memory, so the archive restore
+# done by get_session is never needed there.
+_active_sessions = state_manager.active_sessions
 
 # Import other modules
 from app.interview_session import InterviewSession
@@ -32,6 +40,62 @@ output_queue = None
 worker_process = None
 processing_tasks = {}
 
+# (expiry, session_id) min-heap of finished tasks awaiting removal from
+# processing_tasks, swept by the _expiry_sweeper task
+_task_expiry = []
+
+# Seconds a finished task stays in processing_tasks
+TASK_RETENTION_SECONDS = 60
+
+# Source of the IDs that tie worker results to the task they answer
+_task_ids = itertools.count(1)
+
+# IDs of the tasks submitted for each session that have not yet had their
+# final result, oldest first
+_outstanding_tasks = {}
+
+# Most worker results handled per wakeup of the results handler
+RESULT_BATCH_LIMIT = 32
+
+# Seconds the results handler waits on the output queue at a time
+RESULT_WAIT_TIMEOUT = 1.0
+
+# Session states from which the user may start speaking
+START_SPEAKING_STATES = frozenset(('idle', 'waiting'))
+
+# Worker result statuses that finish a processing task
+FINAL_TASK_STATUSES = frozenset(('success', 'error'))
+
+def requires_session(handler):
+    """
+    Decorate an event handler that operates on an existing session.
+    
+    The payload's session_id is validated and the session fetched once
+    here; on failure the error is emitted to the caller and the handler
+    is not run.
+    
+    Args:
+        handler (callable): Handler taking (session, data)
+        
+    Returns:
+        callable: Event handler taking the raw payload
+    """
+    @functools.wraps(handler)
+    def wrapper(data):
+        session_id = data.get('session_id') if isinstance(data, dict) else None
+        if not session_id:
+            emit('error', {'message': 'Session ID required'})
+            return
+        
+        session = state_manager.get_session(session_id)
+        if not session:
+            logger.debug("Session %s not found for %s", session_id, handler.__name__)
+            emit('error', {'message': 'Session not found'})
+            return
+        
+        return handler(session, data)
+    return wrapper
+
 def initialize_worker():
     """Initialize the worker process."""
     global input_queue, output_queue, worker_process
@@ -46,11 +110,13 @@ def register_events(socketio):
     # Set the socketio instance in the state manager
     state_manager.set_socketio(socketio)
     
-    # Start the worker results handler thread
-    result_thread = threading.Thread(target=handle_worker_results, args=(socketio,))
-    result_thread.daemon = True
-    result_thread.start()
-    logger.info("Started worker results handler thread")
+    # Start the worker results handler as a background task of the
+    # configured async mode, so it runs on the same hub as the handlers
+    socketio.start_background_task(handle_worker_results, socketio)
+    logger.info("Started worker results handler task")
+    
+    # One task retires every finished entry in processing_tasks
+    socketio.start_background_task(_expiry_sweeper)
 
     @socketio.on('connect')
     def handle_connect():
@@ -59,19 +125,16 @@ def register_events(socketio):
         logger.info(f"Client connected: {client_id}")
         
         # Create a new session
-        session_id = str(uuid.uuid4())
+        session_id = secrets.token_hex(16)
         
         # Create session with default configuration
-        config = current_app.config.get('APP_CONFIG', {})
-        default_position = config.get('interview', {}).get('default_position', "Software Engineer")
-        default_difficulty = config.get('interview', {}).get('default_difficulty', 0.5)
-        
         session = InterviewSession(
             session_id=session_id, 
             client_id=client_id,
-            position=default_position,
-            difficulty=default_difficulty
+            position=state_manager.default_position,
+            difficulty=state_manager.default_difficulty
         )
+        session.personality_prompt = state_manager.get_personality_prompt(session.interviewer_type)
         
         # Register session
         state_manager.add_session(session)
@@ -90,29 +153,29 @@ def register_events(socketio):
         session = state_manager.get_session_by_client_id(client_id)
         if session:
             logger.info(f"Marking session {session.session_id} as inactive")
+            session.discard_recording()
+            # Without its recording an utterance cannot be finished; let a
+            # client that rejoins start speaking again
+            if session.state == 'listening':
+                state_manager.set_session_state(session, 'idle')
             state_manager.mark_session_inactive(session.session_id)
+            state_manager.leave_session_room(session.session_id, client_id)
     
     @socketio.on('join_session')
-    def handle_join_session(data):
+    @requires_session
+    def handle_join_session(session, data):
         """Handle client joining a specific session."""
-        session_id = data.get('session_id')
+        session_id = session.session_id
         client_id = request.sid
         # Debug message removed
-        if not session_id:
-            emit('error', {'message': 'Session ID required'})
-            return
-        
-        session = state_manager.get_session(session_id)
-        if not session:
-            emit('error', {'message': 'Session not found'})
-            return
         
         # Join the room for this session
         join_room(session_id)
+        state_manager.join_session_room(session_id, client_id)
         logger.info(f"Client {client_id} joined session {session_id}")
         
         # Update client ID
-        session.client_id = client_id
+        state_manager.rebind_client(session, client_id)
         
         # Send current state
         emit('state_update', {
@@ -120,71 +183,67 @@ def register_events(socketio):
             'state': session.state,
             'turn': session.turn_index
         })
-        
-        # Also send explicit state update
-        emit('explicit_state_update', {
-            'session_id': session_id,
-            'state': session.state,
-            'turn': session.turn_index,
-            'previous_state': session.state
-        })
     
     @socketio.on('configure_session')
-    def handle_configure_session(data):
+    @requires_session
+    def handle_configure_session(session, data):
         """Configure session parameters."""
-        session_id = data.get('session_id')
+        session_id = session.session_id
         config = data.get('config', {})
         # Debug message removed
 
-        if not session_id:
-            emit('error', {'message': 'Session ID required'})
-            return
-        
-        session = state_manager.get_session(session_id)
-        if not session:
-            emit('error', {'message': 'Session not found'})
+        # Validate numeric values before anything is changed, so a bad
+        # value leaves the session as it was
+        try:
+            difficulty = float(config['difficulty']) if 'difficulty' in config else None
+            ack_interval = int(config['audio_ack_interval']) if 'audio_ack_interval' in config else None
+        except (TypeError, ValueError):
+            emit('error', {'message': 'Invalid difficulty or audio_ack_interval'})
             return
-        
+
         # Update session configuration
         if 'position' in config:
             session.position = config['position']
         
-        if 'difficulty' in config:
-            session.difficulty = float(config['difficulty'])
+        if difficulty is not None:
+            session.difficulty = difficulty
         
         if 'interviewer_type' in config:
             session.interviewer_type = config['interviewer_type']
+            # Resolve the prompt once here rather than on every turn
+            session.personality_prompt = state_manager.get_personality_prompt(session.interviewer_type)
+        
+        if ack_interval is not None:
+            session.audio_ack_interval = max(0, ack_interval)
+        
+        # Position, difficulty and interviewer type are in the status snapshot
+        session.invalidate_dict()
         
-        logger.info(f"Session {session_id} configured: {config}")
+        logger.debug("Session %s configured: %s", session_id, config)
         emit('session_configured', {'session_id': session_id})
     
     @socketio.on('start_speaking')
-    def handle_start_speaking(data):
+    @requires_session
+    def handle_start_speaking(session, data):
         """Handle when user starts speaking."""
-        session_id = data.get('session_id')
+        session_id = session.session_id
         # Debug state flow message removed
         # Debug message removed
 
-        if not session_id:
-            emit('error', {'message': 'Session ID required'})
-            return
-        
-        session = state_manager.get_session(session_id)
-        if not session:
-            emit('error', {'message': 'Session not found'})
-            return
-        
         # Check if we can transition to listening state
-        if session.state not in ['idle', 'waiting']:
+        if session.state not in START_SPEAKING_STATES:
             emit('error', {'message': f'Cannot start speaking in {session.state} state'})
             return
         
-        # Update session state
-        state_manager.update_session_state(session_id, 'listening')
-        logger.info(f"Session {session_id} now listening")
+        # Open the WAV file that incoming audio chunks are streamed into
+        audio_path = session.upload_path(state_manager.upload_folder)
+        if not session.start_recording(audio_path):
+            emit('error', {'message': 'Could not start recording'})
+            return
         
-        # Initialize audio buffer
-        session.clear_audio_buffer()
+        # Update session state
+        state_manager.set_session_state(session, 'listening')
+        logger.debug("Session %s now listening", session_id)
         
         emit('listening_started', {'session_id': session_id})
     
@@ -193,58 +252,66 @@ def register_events(socketio):
         """Handle incoming audio data chunks."""
         # Debug message removed
         session_id = data.get('session_id')
-        audio_chunk = data.get('audio')  # Base64 encoded audio
+        audio_chunk = data.get('audio')  # Binary frame, or base64 from older clients
         
         if not session_id or not audio_chunk:
             return
         
-        session = state_manager.get_session(session_id)
-        if not session or session.state != 'listening':
+        session = _active_sessions.get(session_id)
+        if not session or session.state != 'listening' or not session.is_recording:
             return
         
         try:
-            # Decode base64 audio data
-            audio_bytes = base64.b64decode(audio_chunk)
-            
-            # Add to session's audio buffer
-            session.add_audio_chunk(audio_bytes)
+            # Binary attachments arrive as bytes and are used as is. Older
+            # clients send base64 text, which the session gathers and
+            # decodes in batches.
+            if isinstance(audio_chunk, (bytes, bytearray, memoryview)):
+                session.add_audio_chunk(audio_chunk)
+            else:
+                session.add_audio_text(audio_chunk)
             
-            # Acknowledge receipt
-            emit('audio_received', {'session_id': session_id})
+            # Acknowledge the first chunk, then one in every
+            # audio_ack_interval, rather than sending a frame per chunk;
+            # an interval of 0 turns acks off
+            chunks = session.chunk_count
+            interval = session.audio_ack_interval
+            if interval and (chunks - 1) % interval == 0:
+                emit('audio_received', {'session_id': session_id, 'chunks': chunks})
         except Exception as e:
             logger.error(f"Error processing audio chunk: {e}")
     
     @socketio.on('stop_speaking')
-    def handle_stop_speaking(data):
+    @requires_session
+    def handle_stop_speaking(session, data):
         """Handle when user stops speaking."""
-        session_id = data.get('session_id')
+        session_id = session.session_id
         # Debug state flow message removed
-        logger.info(f"Received stop_speaking event for session {session_id}")
+        logger.debug("Received stop_speaking event for session %s", session_id)
 
-        if not session_id:
-            emit('error', {'message': 'Session ID required'})
+        # Check if we're in listening state
+        if session.state != 'listening':
+            emit('error', {'message': f'Cannot stop speaking in {session.state} state'})
             return
         
-        session = state_manager.get_session(session_id)
-        if not session:
-            emit('error', {'message': 'Session not found'})
+        # Drop duplicate requests while an utterance is still being processed;
+        # the lock is released when the worker's final result arrives
+        if not session.process_lock.acquire(blocking=False):
+            emit('error', {'message': 'Already processing a response'})
             return
         
-        # Check if we're in listening state
-        if session.state != 'listening':
-            emit('error', {'message': f'Cannot stop speaking in {session.state} state'})
+        # Finish the recording streamed in during listening
+        audio_path = session.stop_recording()
+        if not audio_path:
+            session.process_lock.release()
+            # Nothing left to finish; leave listening so the client can
+            # start speaking again
+            state_manager.set_session_state(session, 'idle')
+            emit('error', {'message': 'No audio recorded'})
             return
         
         # Update session state
-        state_manager.update_session_state(session_id, 'processing')
-        logger.info(f"Session {session_id} now processing")
-        
-        # Save audio buffer to file
-        audio_path = os.path.join(
-            current_app.config['UPLOAD_FOLDER'], 
-            f"{session_id}_{session.turn_index}.wav"
-        )
-        session.save_audio_buffer(audio_path)
+        state_manager.set_session_state(session, 'processing')
+        logger.debug("Session %s now processing", session_id)
         
         # Send task to worker process instead of processing directly
         submit_processing_task(session_id, audio_path, session)
@@ -252,18 +319,10 @@ def register_events(socketio):
         emit('processing_started', {'session_id': session_id})
     
     @socketio.on('reset_session')
-    def handle_reset_session(data):
+    @requires_session
+    def handle_reset_session(session, data):
         """Reset session to initial state."""
-        session_id = data.get('session_id')
-        
-        if not session_id:
-            emit('error', {'message': 'Session ID required'})
-            return
-        
-        session = state_manager.get_session(session_id)
-        if not session:
-            emit('error', {'message': 'Session not found'})
-            return
+        session_id = session.session_id
         
         # Reset session
         state_manager.reset_session(session_id)
@@ -279,22 +338,12 @@ def register_events(socketio):
         })
     
     @socketio.on('get_state')
-    def handle_get_state(data):
+    @requires_session
+    def handle_get_state(session, data):
         """Handle requests for current state."""
-        session_id = data.get('session_id')
+        session_id = session.session_id
         # Debug message removed
         
-        if not session_id:
-            logger.error("Missing session ID in get_state request")
-            emit('error', {'message': 'Session ID required'})
-            return
-        
-        session = state_manager.get_session(session_id)
-        if not session:
-            logger.error(f"Session {session_id} not found for get_state request")
-            emit('error', {'message': 'Session not found'})
-            return
-        
         # Send current state
         emit('state_update', {
             'session_id': session_id,
@@ -303,14 +352,6 @@ def register_events(socketio):
             'previous_state': session.state  # Same as current since this is just a status update
         })
         
-        # Also send an explicit state update to handle any resynchronization issues
-        emit('explicit_state_update', {
-            'session_id': session_id,
-            'state': session.state,
-            'turn': session.turn_index,
-            'previous_state': session.state  # Same as current since this is just a status update
-        })
-        
         # Add explicit ready_for_next_input notification if in waiting state
         if session.state == 'waiting':
             emit('ready_for_next_input', {
@@ -318,60 +359,9 @@ def register_events(socketio):
                 'state': 'waiting',
                 'turn': session.turn_index
             })
-            logger.info(f"Sent ready_for_next_input for session {session_id} during get_state")
+            logger.debug("Sent ready_for_next_input for session %s during get_state", session_id)
         
-        logger.info(f"State requested for session {session_id}: {session.state}")
-        
-        # If we're in processing state for more than 45 seconds, try to reset to waiting
-        # This handles stuck states
-        if session.state == 'processing' and hasattr(session, 'state_timestamp') and \
-           (time.time() - session.state_timestamp) > 45:  # 45 seconds timeout
-            
-            logger.warning(f"Session {session_id} stuck in processing state for >45s during get_state - resetting to waiting")
-            
-            # Create a fallback response
-            fallback_response = "Thank you for your question. I'd like to explore that further. Can you tell me more about your experience with this?"
-            
-            # Add interviewer message to conversation history
-            session.add_message("interviewer", fallback_response)
-            
-            # Update state
-            state_manager.update_session_state(session_id, 'waiting')
-            
-            # Log the fact that we're sending this message
-            logger.info(f"Sending get_state recovery response to client for session {session_id}")
-            
-            # Send several notifications with slight delays to ensure delivery
-            emit('response_ready', {
-                'session_id': session_id,
-                'text': fallback_response,
-                'audio_url': '',
-                'is_recovery': True
-            })
-            
-            # Use non-blocking sleep
-            eventlet.sleep(0)
-            
-            # Send an explicit state update
-            emit('explicit_state_update', {
-                'session_id': session_id,
-                'state': 'waiting',
-                'turn': session.turn_index,
-                'previous_state': 'processing'
-            })
-            
-            # Use non-blocking sleep
-            eventlet.sleep(0)
-            
-            # Send ready for next input notification
-            emit('ready_for_next_input', {
-                'session_id': session_id,
-                'state': 'waiting',
-                'turn': session.turn_index
-            })
-            
-            # Log recovery action
-            logger.info(f"Session {session_id} recovered from stuck state during get_state")
+        logger.debug("State requested for session %s: %s", session_id, session.state)
 
 def submit_processing_task(session_id, audio_path, session):
     """
@@ -382,12 +372,10 @@ def submit_processing_task(session_id, audio_path, session):
         audio_path (str): Path to audio file
         session (InterviewSession): Session object
     """
-    # Get the app
-    app = get_app()
-    
     # Extract needed session data to avoid serializing the entire session
     session_data = {
         'interviewer_type': session.interviewer_type,
+        'personality_prompt': session.personality_prompt or state_manager.get_personality_prompt(session.interviewer_type),
         'position': session.position,
         'difficulty': session.difficulty,
         'turn_index': session.turn_index,
@@ -395,15 +383,13 @@ def submit_processing_task(session_id, audio_path, session):
     }
     
     # Create task
+    task_id = next(_task_ids)
     task = {
         'command': 'process_audio',
+        'task_id': task_id,
         'session_id': session_id,
         'audio_path': audio_path,
-        'config': {
-            'UPLOAD_FOLDER': app.config['UPLOAD_FOLDER'],
-            'RESPONSE_FOLDER': app.config['RESPONSE_FOLDER'],
-            'APP_CONFIG': app.config.get('APP_CONFIG', {})
-        },
+        'config': state_manager.worker_config,
         'session_data': session_data,
         'timestamp': time.time()
     }
@@ -413,71 +399,163 @@ def submit_processing_task(session_id, audio_path, session):
     
     # Register task in tracking dictionary
     processing_tasks[session_id] = {
+        'task_id': task_id,
         'task': task,
         'status': 'submitted',
         'timestamp': time.time()
     }
     
+    # Only this task's results are delivered to the session from now on
+    session.task_id = task_id
+    _outstanding_tasks.setdefault(session_id, deque()).append(task_id)
+    
     # Submit task to worker process
     input_queue.put(task)
     logger.info(f"Submitted processing task for session {session_id}")
     
+def _claim_task(session_id, task_id, final):
+    """
+    Find the task a worker result belongs to.
+    
+    The worker handles tasks in the order they are queued and ends each
+    with exactly one final result, so a result without a task_id belongs
+    to the oldest task still outstanding for its session.
+    
+    Args:
+        session_id (str): Session ID of the result
+        task_id (int or None): Task ID carried by the result, if any
+        final (bool): Whether the result ends its task
+        
+    Returns:
+        int or None: ID of the task, or None if there is none
+    """
+    outstanding = _outstanding_tasks.get(session_id)
+    if task_id is None and outstanding:
+        task_id = outstanding[0]
+    
+    if final and outstanding and task_id in outstanding:
+        outstanding.remove(task_id)
+        if not outstanding:
+            del _outstanding_tasks[session_id]
+    
+    return task_id
+
+def _expire_tasks(now):
+    """
+    Remove finished tasks whose retention period has passed.
+    
+    A session may have submitted a new task since its entry was queued;
+    only the entry still carrying the queued expiry is removed.
+    
+    Args:
+        now (float): Current time.monotonic() value
+    """
+    while _task_expiry and _task_expiry[0][0] <= now:
+        expires, session_id = heapq.heappop(_task_expiry)
+        task_info = processing_tasks.get(session_id)
+        if task_info is not None and task_info.get('expires') == expires:
+            del processing_tasks[session_id]
+
+def _expiry_sweeper():
+    """
+    Background task that removes finished tasks once their retention ends.
+    
+    Sleeps until the earliest queued expiry, or a full retention period
+    when nothing is queued; an entry pushed meanwhile expires no earlier
+    than that.
+    """
+    while True:
+        try:
+            now = time.monotonic()
+            _expire_tasks(now)
+            if _task_expiry:
+                eventlet.sleep(max(0, _task_expiry[0][0] - now))
+            else:
+                eventlet.sleep(TASK_RETENTION_SECONDS)
+        except Exception as e:
+            logger.error(f"Error in task expiry sweeper: {e}")
+            eventlet.sleep(1)
+
 def handle_worker_results(socketio):
     """
-    Thread function that handles results from the worker process.
+    Background task that handles results from the worker process.
     
     Args:
         socketio (SocketIO): Socket.IO instance for emitting events
     """
     logger.info("Worker results handler started")
     
-    # Import eventlet here to ensure it's available and to monkeypatch this function
-    import eventlet
     eventlet.sleep(0)  # Give control back to the event loop immediately
     
     while True:
         try:
-            # Use non-blocking queue operations to avoid blocking the thread
+            # Park until the worker posts a result. The blocking get runs on
+            # a native thread, so the hub keeps serving sockets meanwhile;
+            # it times out now and then so that thread is never stuck in
+            # get() when the interpreter joins it at exit. Read errors fall
+            # through to the outer handler, which backs off.
             try:
-                # Non-blocking get with a very short timeout
+                result = tpool.execute(output_queue.get, True, RESULT_WAIT_TIMEOUT)
+            except queue.Empty:
+                continue
+            batch = [result]
+            
+            # Take whatever else the worker has posted meanwhile, so a burst
+            # of results is handled in one wakeup
+            while len(batch) < RESULT_BATCH_LIMIT:
                 try:
-                    result = output_queue.get(timeout=0.01)
-                except:
-                    # No result available, continue loop
-                    eventlet.sleep(0.01)  # Short sleep to prevent CPU spinning
-                    continue
-                
-                # Get session ID from result
-                session_id = result.get('session_id')
-                
-                if not session_id:
-                    logger.warning(f"Received result without session ID: {result}")
-                    continue
-                
-                # Get app for app context
-                app = get_app()
-                
-                # Get session
-                with app.app_context():
+                    batch.append(output_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            # cleanup() posts None to stop the handler
+            stopping = None in batch
+            if stopping:
+                batch = [result for result in batch if result is not None]
+            
+            for result in batch:
+                try:
+                    # Get session ID from result
+                    session_id = result.get('session_id')
+                    
+                    if not session_id:
+                        logger.warning(f"Received result without session ID: {result}")
+                        continue
+                    
+                    status = result['status']
+                    task_id = _claim_task(session_id, result.get('task_id'),
+                                          status in FINAL_TASK_STATUSES)
+                    
+                    # Get session. Nothing below uses current_app; emits go
+                    # through the socketio instance, so no app context is pushed.
                     session = state_manager.get_session(session_id)
                     
                     if not session:
                         logger.warning(f"Session {session_id} not found for result: {result}")
                         continue
                     
+                    # Results of a run that was recovered or reset must not
+                    # release or answer the turn that has replaced it
+                    if task_id is None or task_id != session.task_id:
+                        logger.info("Dropping stale %s result of task %s for session %s",
+                                    status, task_id, session_id)
+                        continue
+                    
+                    # A final result ends the pipeline run; release the session
+                    # before anything is sent so the client can go again
+                    if result['status'] in FINAL_TASK_STATUSES:
+                        state_manager.release_processing(session)
+                    
                     # Handle different result types
                     if result['status'] == 'error':
                         # Handle error
                         logger.error(f"Error in worker process for session {session_id}: {result.get('error')}")
                         
-                        # Move to waiting state with an error message
-                        state_manager.update_session_state(session_id, 'waiting')
-                        
                         # Send error message to client
-                        socketio.emit('error', {
+                        state_manager.emit_to_session('error', {
                             'message': f"Processing error: {result.get('error')}",
                             'session_id': session_id
-                        }, room=session_id)
+                        }, session)
                         
                         # Also send a recovery response
                         fallback_response = "I apologize, but I encountered an issue processing your response. Could you please try again or rephrase your question?"
@@ -485,32 +563,24 @@ def handle_worker_results(socketio):
                         # Add interviewer message to conversation history
                         session.add_message("interviewer", fallback_response)
                         
-                        # Send recovery response
-                        socketio.emit('response_ready', {
-                            'session_id': session_id,
+                        # Move to waiting state and send the recovery response
+                        state_manager.deliver_response(session, {
                             'text': fallback_response,
                             'audio_url': '',
                             'is_recovery': True
-                        }, room=session_id)
-                        
-                        # Send ready for next input notification
-                        socketio.emit('ready_for_next_input', {
-                            'session_id': session_id,
-                            'state': 'waiting',
-                            'turn': session.turn_index
-                        }, room=session_id)
+                        })
                         
                     elif result['status'] == 'progress':
                         # Handle progress update
-                        logger.info(f"Progress update for session {session_id}: {result.get('message')} ({result.get('progress')}%)")
+                        logger.debug("Progress update for session %s: %s (%s%%)",
+                                     session_id, result.get('message'), result.get('progress'))
                         
                         # Store transcription if available
                         if 'transcription' in result:
                             # Make sure we haven't already added this message
-                            if not any(msg.get('text') == result['transcription'] and msg.get('speaker') == 'user' 
-                                    for msg in session.conversation_history):
+                            if not session.has_message("user", result['transcription']):
                                 session.add_message("user", result['transcription'])
-                                logger.info(f"Added user message to conversation history for session {session_id}")
+                                logger.debug("Added user message to conversation history for session %s", session_id)
                         
                     elif result['status'] == 'success':
                         # Handle success
@@ -518,40 +588,15 @@ def handle_worker_results(socketio):
                         
                         # Store response in conversation history if not already there
                         response_text = result.get('response_text', '')
-                        if response_text and not any(msg.get('text') == response_text and msg.get('speaker') == 'interviewer' 
-                               for msg in session.conversation_history):
+                        if response_text and not session.has_message("interviewer", response_text):
                             session.add_message("interviewer", response_text)
                         
-                        # Update state to waiting
-                        state_manager.update_session_state(session_id, 'waiting')
-                        
-                        # Send response to client
-                        socketio.emit('response_ready', {
-                            'session_id': session_id,
+                        # Complete the turn: the waiting state and new turn
+                        # index travel with response_ready
+                        state_manager.deliver_response(session, {
                             'text': response_text,
                             'audio_url': result.get('audio_url', '')
-                        }, room=session_id)
-                        
-                        # Use eventlet sleep instead of blocking time.sleep
-                        eventlet.sleep(0)
-                        
-                        # Send explicit state update
-                        socketio.emit('explicit_state_update', {
-                            'session_id': session_id,
-                            'state': 'waiting',
-                            'turn': session.turn_index,
-                            'previous_state': 'processing'
-                        }, room=session_id)
-                        
-                        # Increment turn index
-                        session.turn_index += 1
-                        
-                        # Send ready for next input notification
-                        socketio.emit('ready_for_next_input', {
-                            'session_id': session_id,
-                            'state': 'waiting',
-                            'turn': session.turn_index
-                        }, room=session_id)
+                        }, advance_turn=True)
                     
                     # Update task tracking
                     if session_id in processing_tasks:
@@ -559,66 +604,34 @@ def handle_worker_results(socketio):
                         processing_tasks[session_id]['updated'] = time.time()
                         
                         # Remove completed tasks after some time
-                        if result['status'] in ['success', 'error']:
-                            def cleanup_task():
-                                # Use non-blocking approach for cleanup
-                                start_time = time.time()
-                                def do_cleanup():
-                                    if time.time() - start_time >= 60 and session_id in processing_tasks:
-                                        del processing_tasks[session_id]
-                                import eventlet
-                                eventlet.sleep(60)  # Non-blocking sleep
-                                do_cleanup()
-                            
-                            cleanup_thread = threading.Thread(target=cleanup_task)
-                            cleanup_thread.daemon = True
-                            cleanup_thread.start()
-            except Exception as e:
-                # Just log and continue in case of error getting or processing a result
-                if "empty" not in str(e).lower():  # Ignore "queue is empty" errors
+                        if result['status'] in FINAL_TASK_STATUSES:
+                            expires = time.monotonic() + TASK_RETENTION_SECONDS
+                            processing_tasks[session_id]['expires'] = expires
+                            heapq.heappush(_task_expiry, (expires, session_id))
+                except Exception as e:
+                    # Just log and continue in case of error getting or processing a result
                     logger.error(f"Error processing worker result: {e}")
             
-            # Use eventlet sleep to avoid blocking the event loop
+            if stopping:
+                logger.info("Worker results handler stopped")
+                return
+            
+            # Let the emits for this batch go out before waiting again
             eventlet.sleep(0)
             
         except Exception as e:
             logger.error(f"Error in worker result handler: {e}")
             eventlet.sleep(0.1)  # Use shorter, non-blocking sleep on error
 
-def get_app():
-    """
-    Function to get the Flask app instance from the main module.
-    This avoids circular imports.
-    """
-    try:
-        from flask import current_app
-        return current_app._get_current_object()
-    except RuntimeError:
-        # If we're outside the application context
-        import sys
-        if 'server' in sys.modules:
-            return sys.modules['server'].app
-        else:
-            # If all else fails, import directly
-            try:
-                from app import create_app
-                import json
-                try:
-                    with open("config.json", "r") as f:
-                        config = json.load(f)
-                except:
-                    # Default config if file not found
-                    config = {"server": {"host": "0.0.0.0", "port": 8081}}
-                app, _ = create_app(config)
-                return app
-            except Exception as e:
-                logger.error(f"Error creating app in get_app: {e}")
-                return None
-
 def cleanup():
     """Clean up resources when server shuts down."""
     global input_queue, worker_process
     try:
+        # Stop the results handler, so no native thread is left waiting
+        # on a queue nothing will post to again
+        if output_queue is not None:
+            output_queue.put(None)
+        
         if input_queue is not None and worker_process is not None:
             # Send shutdown signal
             input_queue.put({'command': 'shutdown'})
@@ -632,13 +645,9 @@ def cleanup():
                 logger.info("Worker process terminated forcefully")
                 
                 # On Windows, we may need an additional kill
-                import os
-                import signal
-                import platform
-                if platform.system() == "Windows":
+                if os.name == 'nt':
                     try:
                         # Try to kill the process directly by PID
-                        import subprocess
                         subprocess.run(["taskkill", "/F", "/PID", str(worker_process.pid)], 
                                       shell=True, capture_output=True)
                         logger.info(f"Forced kill of worker process PID {worker_process.pid}")
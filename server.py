@@ -6,10 +6,9 @@ Initializes the Flask app and WebSocket server.
 
 import os
 import sys
-import json
 import logging
-import threading
 import eventlet
+import orjson
 import atexit
 
 # Needed for eventlet WebSocket
@@ -50,8 +49,8 @@ from app import create_app
 def load_config():
     """Load configuration from config.json"""
     try:
-        with open("config.json", "r") as f:
-            return json.load(f)
+        with open("config.json", "rb") as f:
+            return orjson.loads(f.read())
     except Exception as e:
         logger.error(f"Error loading config: {e}")
         logger.info("Using default configuration")
@@ -86,14 +85,9 @@ if __name__ == '__main__':
     # Register cleanup function to run at exit
     atexit.register(websocket_cleanup)
     
-    # Start cleanup thread for inactive sessions
-    from app.utils import cleanup_inactive_sessions
-    cleanup_thread = threading.Thread(
-        target=cleanup_inactive_sessions,
-        args=(app.config.get('SESSION_TIMEOUT', 1800),)
-    )
-    cleanup_thread.daemon = True
-    cleanup_thread.start()
+    # Start cleanup greenthread for inactive sessions
+    from app.utils import start_cleanup_greenthread
+    start_cleanup_greenthread(app.config.get('SESSION_TIMEOUT', 1800))
     
     # Log startup information
     logger.info(f"Starting WebSocket server on http://{config['server']['host']}:{config['server']['port']}")
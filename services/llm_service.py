@@ -119,19 +119,21 @@ def _get_model_and_tokenizer(model_path):
     
     return _model, _tokenizer
 
-def _build_prompt(user_input, conversation_history, personality_prompt, position, difficulty):
+@functools.lru_cache(maxsize=64)
+def _build_system_prefix(personality_prompt, position, difficulty):
     """
-    Build a prompt for the LLM.
+    Build the part of the prompt that precedes the conversation.
+    
+    It depends only on the session's configuration, so it is built once
+    per configuration and reused for every turn.
     
     Args:
-        user_input (str): The user's input text
-        conversation_history (str): The conversation history
         personality_prompt (str): The interviewer personality prompt
         position (str): The job position
         difficulty (float): The interview difficulty (0.0-1.0)
         
     Returns:
-        str: The formatted prompt
+        str: The prompt prefix, ending where the conversation history starts
     """
     # Add difficulty modifier to personality prompt
     difficulty_modifier = ""
@@ -141,20 +143,37 @@ def _build_prompt(user_input, conversation_history, personality_prompt, position
         difficulty_modifier = "\nBe supportive and helpful, providing guidance if the candidate struggles."
     
     # Format the prompt for Phi-2 style - note that Phi-2 uses a particular format
-    # The crucial part is to end the user's most recent message and add "Interviewer:" as a prompt
     # We wrap the entire conversation in a chat context
-    
-    # Add user's most recent input to conversation history if not already there
-    recent_input_prompt = f"\nCandidate: {user_input}\nInterviewer:"
-    
-    # Format the prompt specifically for Phi-2
-    prompt = f"""<s>You are an AI assistant that helps with job interviews.
+    return f"""<s>You are an AI assistant that helps with job interviews.
     
     {personality_prompt}
     You're conducting an interview for a {position} position.{difficulty_modifier}
     
     Previous conversation:
-    {conversation_history}{recent_input_prompt}"""
+    """
+
+def _build_prompt(user_input, conversation_history, personality_prompt, position, difficulty):
+    """
+    Build a prompt for the LLM.
+    
+    Args:
+        user_input (str): The user's input text
+        conversation_history (str): The conversation history
+        personality_prompt (str): The interviewer personality prompt
+        position (str): The job position
+        difficulty (float): The interview difficulty (0.0-1.0)
+        
+    Returns:
+        str: The formatted prompt
+    """
+    # The crucial part is to end the user's most recent message and add "Interviewer:" as a prompt
+    
+    # Add user's most recent input to conversation history if not already there
+    recent_input_prompt = f"\nCandidate: {user_input}\nInterviewer:"
+    
+    # Format the prompt specifically for Phi-2
+    prefix = _build_system_prefix(personality_prompt, position, difficulty)
+    prompt = f"{prefix}{conversation_history}{recent_input_prompt}"
     
     logger.info(f"Prompt format: {prompt[:200]}...")
     
@@ -326,6 +345,10 @@ def format_conversation_for_llm(messages, max_history=10):
     # Format messages
     formatted_history = ""
     for msg in recent_messages:
+        if msg['speaker'] == 'system':
+            # Rolling summary of compacted messages
+            formatted_history += f"Summary of earlier conversation: {msg['text']}\n"
+            continue
         speaker = "Candidate" if msg['speaker'] == 'user' else "Interviewer"
         formatted_history += f"{speaker}: {msg['text']}\n"
     
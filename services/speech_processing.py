@@ -86,6 +86,22 @@ def transcribe_audio(audio_path, language="en", model_name="base"):
         logger.error(f"Error transcribing audio: {e}")
         return None
 
+def _estimate_word_count(text):
+    """
+    Estimate the number of words in text for speech duration estimates.
+    
+    Counts spaces in a single scan instead of building the list of words
+    that text.split() would allocate; runs of whitespace make it slightly
+    overcount, which is fine for a duration estimate.
+    
+    Args:
+        text (str): Text to be spoken
+        
+    Returns:
+        int: Approximate word count
+    """
+    return text.count(' ') + 1 if text else 0
+
 def _create_silent_audio_file(output_path, duration=5.0, sample_rate=22050):
     """
     Create a silent WAV file as a fallback when TTS fails.
@@ -138,8 +154,7 @@ def generate_speech(text, output_path, config=None):
         bool: True if successful, False otherwise
     """
     # Create silent audio file with duration based on text length
-    words = text.split()
-    word_count = len(words)
+    word_count = _estimate_word_count(text)
     
     # Roughly 3 words per second for average speech
     duration = max(5.0, word_count * 0.33)  # At least 5 seconds, ~330ms per word
@@ -240,7 +255,7 @@ def _generate_speech_gtts(text, output_path):
         # If we're already in offline mode or if text is very long, use the silent fallback
         if _generate_speech_gtts.offline_mode or len(text) > 1000:
             logger.warning("Using offline mode for TTS or text is too long")
-            return _create_silent_audio_file(output_path, duration=len(text.split()) * 0.3)
+            return _create_silent_audio_file(output_path, duration=_estimate_word_count(text) * 0.3)
         
         # Generate speech with a timeout
         import threading
@@ -271,12 +286,12 @@ def _generate_speech_gtts(text, output_path):
         if thread.is_alive():
             logger.error("TTS generation timed out after 10 seconds")
             _generate_speech_gtts.offline_mode = True
-            return _create_silent_audio_file(output_path, duration=len(text.split()) * 0.3)
+            return _create_silent_audio_file(output_path, duration=_estimate_word_count(text) * 0.3)
         
         if not result[0]:
             logger.error(f"Error in TTS thread: {error[0]}")
             _generate_speech_gtts.offline_mode = True
-            return _create_silent_audio_file(output_path, duration=len(text.split()) * 0.3)
+            return _create_silent_audio_file(output_path, duration=_estimate_word_count(text) * 0.3)
         
         # Check if file was created
         if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
@@ -285,9 +300,9 @@ def _generate_speech_gtts(text, output_path):
         else:
             logger.error("gTTS failed to generate speech file")
             _generate_speech_gtts.offline_mode = True
-            return _create_silent_audio_file(output_path, duration=len(text.split()) * 0.3)
+            return _create_silent_audio_file(output_path, duration=_estimate_word_count(text) * 0.3)
             
     except Exception as e:
         logger.error(f"Error generating speech with gTTS: {e}")
         _generate_speech_gtts.offline_mode = True
-        return _create_silent_audio_file(output_path, duration=len(text.split()) * 0.3)
\ No newline at end of file
+        return _create_silent_audio_file(output_path, duration=_estimate_word_count(text) * 0.3)
\ No newline at end of file
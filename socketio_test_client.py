@@ -7,7 +7,6 @@ Simulates the Unity client to test server functionality.
 import asyncio
 import socketio
 import time
-import base64
 import os
 import wave
 import argparse
@@ -89,6 +88,8 @@ class InterviewTestClient:
     def on_response_ready(self, data):
         response_text = data['text']
         audio_url = data['audio_url']
+        # The server folds the post-response state into this event
+        self.current_state = data.get('state', self.current_state)
         print(f"Response: {response_text}")
         print(f"Audio URL: {audio_url}")
         
@@ -185,11 +186,11 @@ class InterviewTestClient:
             chunk_size = self.audio_chunk_size
             for i in range(0, len(audio_data), chunk_size):
                 chunk = audio_data[i:i+chunk_size]
-                base64_chunk = base64.b64encode(chunk).decode('utf-8')
                 
+                # Sent as a binary attachment, no base64 needed
                 self.sio.emit('audio_data', {
                     'session_id': self.session_id,
-                    'audio': base64_chunk
+                    'audio': chunk
                 })
                 
                 # Small delay between chunks to simulate streaming
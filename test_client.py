@@ -7,7 +7,6 @@ import socketio
 import time
 import argparse
 import os
-import base64
 import wave
 import numpy as np
 from threading import Event, Lock, Thread
@@ -87,16 +86,18 @@ def on_state_update(data):
     with state_lock:
         current_state = state
         
+        # A response is available once the server is responding or waiting
+        if state in ['waiting', 'responding']:
+            if not response_received_event.is_set():
+                response_received_event.set()
+        
         # Print an obvious marker when waiting state is reached
         if state == "waiting":
             print("\n*** READY FOR NEXT QUESTION ***\n")
-            # Also set response received event if it's not set
-            if not response_received_event.is_set():
-                response_received_event.set()
 
 @sio.on('explicit_state_update')
 def on_explicit_state_update(data):
-    """Handle explicit state updates from the server."""
+    """Handle explicit state updates from older servers."""
     global current_state
     state = data['state']
     turn = data.get('turn', 0)
@@ -468,13 +469,11 @@ def send_test_audio(file_path=None):
         with wave.open(file_path, 'rb') as wf:
             audio_data = wf.readframes(wf.getnframes())
         
-        # Send the entire audio in one chunk
-        base64_audio = base64.b64encode(audio_data).decode('utf-8')
-        
+        # Send the entire audio in one chunk as a binary frame
         print(f"Sending audio data ({len(audio_data)} bytes)")
         sio.emit('audio_data', {
             'session_id': session_id,
-            'audio': base64_audio
+            'audio': audio_data
         })
         
         print("Audio data sent successfully")
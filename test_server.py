@@ -236,6 +236,38 @@ def check_llm_model():
         print(f"❌ Error checking LLM model: {e}")
         return False
 
+def check_response_range_requests():
+    """Check that response audio is served with HTTP Range support."""
+    import tempfile
+    try:
+        from flask import Flask
+        from app.routes import register_routes
+        
+        with tempfile.TemporaryDirectory() as response_folder:
+            with open(os.path.join(response_folder, "range_test.wav"), "wb") as f:
+                f.write(bytes(range(256)))
+            
+            app = Flask(__name__)
+            app.config['RESPONSE_FOLDER'] = response_folder
+            register_routes(app)
+            
+            client = app.test_client()
+            response = client.get("/responses/range_test.wav", headers={"Range": "bytes=16-31"})
+            
+            if (response.status_code == 206
+                    and response.headers.get("Content-Range") == "bytes 16-31/256"
+                    and response.data == bytes(range(16, 32))):
+                print("✅ Response audio supports Range requests")
+                return True
+            
+            print(f"❌ Range request returned {response.status_code} "
+                  f"(Content-Range: {response.headers.get('Content-Range')})")
+            return False
+            
+    except Exception as e:
+        print(f"❌ Error checking Range requests: {e}")
+        return False
+
 def test_server_startup():
     """Attempt to start the server briefly to test for issues."""
     print("\nTesting server startup (will stop after 5 seconds)...")
@@ -302,6 +334,11 @@ def run_tests():
     dirs_ok = check_directories()
     print()
     
+    # Check HTTP serving of response audio
+    print("Checking response audio serving...")
+    range_ok = check_response_range_requests()
+    print()
+    
     # Check hardware
     print("Checking hardware...")
     gpu_status = check_gpu()
@@ -327,6 +364,7 @@ def run_tests():
     print(f"File structure: {'✅ OK' if files_ok else '❌ Failed'}")
     print(f"Configuration: {'✅ OK' if config_ok else '❌ Failed'}")
     print(f"Directories: {'✅ OK' if dirs_ok else '❌ Failed'}")
+    print(f"Range requests: {'✅ OK' if range_ok else '❌ Failed'}")
     print(f"GPU: {'✅ Available' if gpu_status == True else '⚠️ Not available' if gpu_status == 'cpu' else '⚠️ Unknown'}")
     print(f"Microphone: {'✅ Available' if mic_status == True else '⚠️ Not available' if mic_status == False else '⚠️ Unknown'}")
     print(f"LLM model: {'✅ OK' if model_ok else '❌ Failed'}")